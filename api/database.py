@@ -1,51 +1,51 @@
+import sys
 import pandas as pd
+import numpy as np
 import os
 from datetime import datetime
-import pickle
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+
+from recognition.store import gallery_path_for
+from recognition.journal import append_enrollment
+from recognition.service import encodings_view, get_gallery_service
+from records.punch_state import get_punch_index
+
 ENCODINGS_FILE = os.path.join(BASE_DIR, "data", "encodings.pkl")
+GALLERY_FILE = gallery_path_for(ENCODINGS_FILE)
 ATTENDANCE_FILE = os.path.join(BASE_DIR, "attendance", "attendance.csv")
 
-# Ensure attendance file exists
-if not os.path.exists(ATTENDANCE_FILE):
-    df = pd.DataFrame(columns=["Name", "Date", "Time", "Type"])
-    df.to_csv(ATTENDANCE_FILE, index=False)
+# Ensure attendance file exists (append-only ledger, same CSV layout)
+punches = get_punch_index(ATTENDANCE_FILE)
 
 def load_encodings():
-    if not os.path.exists(ENCODINGS_FILE) or os.path.getsize(ENCODINGS_FILE) == 0:
-        return {"encodings": [], "names": []}
+    """
+    Gallery as {"encodings", "names"} from the shared, version-keyed gallery cache:
+    encodings is the float32 matrix and names a per-row view, so repeated calls
+    neither re-read nor re-validate the store.
+    """
+    return encodings_view(get_gallery_service(GALLERY_FILE, ENCODINGS_FILE, index="exact").matcher())
 
-    try:
-        with open(ENCODINGS_FILE, "rb") as f:
-            data = pickle.load(f)
-            if not isinstance(data, dict):
-                return {"encodings": [], "names": []}
-            
-            if "encodings" in data and "names" in data:
-                # Filter for valid dimensions
-                valid_indices = [i for i, enc in enumerate(data["encodings"]) if hasattr(enc, "shape") and enc.shape == (128,)]
-                return {
-                    "encodings": [data["encodings"][i] for i in valid_indices],
-                    "names": [data["names"][i] for i in valid_indices]
-                }
-            else:
-                # Convert old structure
-                new_data = {"encodings": [], "names": []}
-                for name, encs in data.items():
-                    if isinstance(encs, list):
-                        for enc in encs:
-                            import numpy as np
-                            if hasattr(enc, "shape") and enc.shape == (128,):
-                                new_data["encodings"].append(enc)
-                                new_data["names"].append(name)
-                return new_data
-    except:
-        return {"encodings": [], "names": []}
+def enroll_samples(data):
+    """ Enroll the NEW samples in data ({"encodings", "names"}) as one journal segment """
+    append_enrollment(GALLERY_FILE, data["encodings"], data["names"])
 
 def save_encodings(data):
-    with open(ENCODINGS_FILE, "wb") as f:
-        pickle.dump(data, f)
+    """
+    Legacy full-gallery write: data is the loaded gallery plus new samples.
+    Only the rows beyond the current gallery are enrolled; anything else
+    (a subset, reordered or edited rows) is rejected rather than duplicated.
+    """
+    current = load_encodings()
+    count = len(current["names"])
+    names = list(data["names"])
+    encodings = np.asarray(data["encodings"], dtype=np.float32).reshape(-1, 128)
+    if (len(names) < count or names[:count] != list(current["names"][:count])
+            or not np.array_equal(encodings[:count], current["encodings"][:count])):
+        raise ValueError("save_encodings() expects the full loaded gallery plus new samples; "
+                         "use enroll_samples() to enroll new samples only")
+    enroll_samples({"encodings": encodings[count:], "names": names[count:]})
 
 def read_attendance():
     if not os.path.exists(ATTENDANCE_FILE) or os.path.getsize(ATTENDANCE_FILE) == 0:
@@ -59,21 +59,5 @@ def write_attendance(df):
     df.to_csv(ATTENDANCE_FILE, index=False)
 
 def mark_attendance(name):
-    df = read_attendance()
-
-    now = datetime.now()
-    date = now.strftime("%Y-%m-%d")
-    time = now.strftime("%H:%M:%S")
-
-    today_records = df[(df["Name"] == name) & (df["Date"] == date)]
-
-    if len(today_records) == 0:
-        record_type = "Punch-In"
-    else:
-        last = today_records.iloc[-1]["Type"]
-        record_type = "Punch-Out" if last == "Punch-In" else "Punch-In"
-
-    df.loc[len(df)] = [name, date, time, record_type]
-    write_attendance(df)
-
-    return record_type
+    """ Record type punched, or None if the name punched less than MIN_PUNCH_GAP_SECONDS ago """
+    return punches.punch(name, datetime.now())
@@ -1,13 +1,19 @@
+import os
+import sys
 from fastapi import FastAPI, Body
 from fastapi.middleware.cors import CORSMiddleware
 from datetime import datetime, date
 from pydantic import BaseModel
-import sqlite3
+from typing import List
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from sqlite_pool import ConnectionPool
 
 class AttendanceItem(BaseModel):
     name: str
     timestamp: str = None
     type: str = "Punch-In"
+    idempotency_key: str = None
 
 app = FastAPI(title="Face Attendance API")
 
@@ -20,12 +26,28 @@ app.add_middleware(
 
 DB_FILE = "attendance.db"
 
+# Constant SQL text so each pooled connection prepares these once
+INSERT_SQL = "INSERT OR IGNORE INTO attendance (name, date, time, type, idempotency_key) VALUES (?, ?, ?, ?, ?)"
+INSERT_BATCH_SQL = "INSERT INTO attendance (name, date, time, type, idempotency_key) VALUES (?, ?, ?, ?, ?)"
+BEGIN_WRITE_SQL = "BEGIN IMMEDIATE"
+TODAY_SQL = "SELECT name, time, type FROM attendance WHERE date=?"
+
+pool = ConnectionPool(DB_FILE)
+
 def get_db():
-    return sqlite3.connect(DB_FILE, check_same_thread=False)
+    """ Borrow a pooled connection: `with get_db() as conn:` """
+    return pool.connection()
 
 @app.on_event("startup")
 def startup():
-    conn = get_db()
+    with get_db() as conn:
+        _create_schema(conn)
+
+@app.on_event("shutdown")
+def shutdown():
+    pool.close()
+
+def _create_schema(conn):
     cur = conn.cursor()
     cur.execute("""
         CREATE TABLE IF NOT EXISTS attendance (
@@ -36,8 +58,12 @@ def startup():
             type TEXT
         )
     """)
+    columns = {row[1] for row in cur.execute("PRAGMA table_info(attendance)")}
+    if "idempotency_key" not in columns:
+        cur.execute("ALTER TABLE attendance ADD COLUMN idempotency_key TEXT")
+    cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS ix_attendance_idempotency_key ON attendance (idempotency_key)")
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_attendance_date_name ON attendance (date, name)")
     conn.commit()
-    conn.close()
 
 @app.post("/attendance")
 def mark_attendance(item: AttendanceItem):
@@ -45,24 +71,61 @@ def mark_attendance(item: AttendanceItem):
     date_str = now.strftime("%Y-%m-%d")
     time_str = now.strftime("%H:%M:%S")
     
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute(
-        "INSERT INTO attendance (name, date, time, type) VALUES (?, ?, ?, ?)",
-        (item.name, date_str, time_str, item.type)
-    )
-    conn.commit()
-    conn.close()
-    return {"status": "ok", "name": item.name, "type": item.type}
+    with get_db() as conn, conn:
+        cur = conn.execute(INSERT_SQL, (item.name, date_str, time_str, item.type, item.idempotency_key))
+    # A retried punch whose idempotency_key is already stored inserts nothing
+    status = "ok" if cur.rowcount == 1 else "duplicate"
+    return {"status": status, "name": item.name, "type": item.type}
+
+def _split_timestamp(timestamp, now):
+    """ Client "YYYY-MM-DD HH:MM:SS" (or ISO) -> (date, time); falls back to arrival time """
+    ts = now
+    if timestamp:
+        try:
+            ts = datetime.fromisoformat(timestamp)
+        except ValueError:
+            pass
+    return ts.strftime("%Y-%m-%d"), ts.strftime("%H:%M:%S")
+
+@app.post("/attendance/batch")
+def mark_attendance_batch(items: List[AttendanceItem]):
+    """ Many punches, one transaction, one executemany; repeated idempotency keys are skipped """
+    now = datetime.now()
+    with get_db() as conn, conn:
+        # Take the write lock before the lookup: no concurrent request can store one of
+        # our keys between the SELECT and the INSERT, so every "created" really was
+        conn.execute(BEGIN_WRITE_SQL)
+        keys = list({i.idempotency_key for i in items if i.idempotency_key})
+        existing = set()
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            cur = conn.execute(
+                f"SELECT idempotency_key FROM attendance WHERE idempotency_key IN ({','.join('?' * len(chunk))})",
+                chunk
+            )
+            existing.update(r[0] for r in cur.fetchall())
+
+        seen, rows, results = set(), [], []
+        for index, item in enumerate(items):
+            key = item.idempotency_key
+            if key and (key in existing or key in seen):
+                results.append({"index": index, "idempotency_key": key, "status": "duplicate"})
+                continue
+            if key:
+                seen.add(key)
+            date_str, time_str = _split_timestamp(item.timestamp, now)
+            rows.append((item.name, date_str, time_str, item.type, key))
+            results.append({"index": index, "idempotency_key": key, "status": "created"})
+
+        conn.executemany(INSERT_BATCH_SQL, rows)
+    return {"status": "ok", "created": len(rows), "duplicates": len(items) - len(rows), "results": results}
 
 @app.get("/attendance/today")
 def today_attendance():
     today = date.today().strftime("%Y-%m-%d")
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute("SELECT name, time, type FROM attendance WHERE date=?", (today,))
-    records = [{"name": r[0], "time": r[1], "type": r[2]} for r in cur.fetchall()]
-    conn.close()
+    with get_db() as conn:
+        rows = conn.execute(TODAY_SQL, (today,)).fetchall()
+    records = [{"name": r[0], "time": r[1], "type": r[2]} for r in rows]
     return {"date": today, "records": records, "count": len(records)}
 
 @app.get("/")
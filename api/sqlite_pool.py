@@ -0,0 +1,76 @@
+"""
+Small pool of long-lived sqlite3 connections for the FastAPI app.
+
+Each connection is opened once with WAL journaling (readers never wait for
+the writer), synchronous=NORMAL (durable across app crashes; fsync at
+checkpoints), a larger page cache and a busy timeout instead of immediate
+"database is locked" errors. sqlite3 keeps a per-connection cache of compiled
+statements keyed by SQL text, so reusing connections and constant SQL strings
+means statements are prepared once per connection rather than once per request.
+"""
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+POOL_SIZE = 8
+STATEMENT_CACHE = 128
+BUSY_TIMEOUT_MS = 5000
+CACHE_SIZE_KB = 16 * 1024
+
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    f"PRAGMA cache_size=-{CACHE_SIZE_KB}",
+    "PRAGMA temp_store=MEMORY",
+    f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}",
+)
+
+
+class ConnectionPool:
+    def __init__(self, path, size=POOL_SIZE, timeout=30.0):
+        self.path = path
+        self.size = size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False,
+                               cached_statements=STATEMENT_CACHE,
+                               timeout=BUSY_TIMEOUT_MS / 1000)
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                return self._connect()
+        # Pool exhausted: wait for a connection to come back (back-pressure)
+        return self._idle.get(timeout=self.timeout)
+
+    @contextmanager
+    def connection(self):
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.put(conn)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+        with self._lock:
+            self._created = 0
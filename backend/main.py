@@ -1,11 +1,15 @@
 from fastapi import FastAPI, Depends
+from sqlalchemy import func, insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from datetime import date
+from datetime import date, datetime, timezone
+from typing import List
 from database import engine, SessionLocal
-from models import Attendance, Base
-from schemas import AttendanceCreate
+from models import Attendance
+from schemas import AttendanceCreate, AttendanceEvent
+from migrate import migrate
 
-Base.metadata.create_all(bind=engine)
+migrate(engine)
 
 app = FastAPI(title="Face Attendance API")
 
@@ -20,20 +24,84 @@ def get_db():
 # ================= POST =================
 @app.post("/attendance")
 def mark_attendance(data: AttendanceCreate, db: Session = Depends(get_db)):
+    now = datetime.utcnow()
     record = Attendance(
         name=data.name,
-        type=data.type
+        type=data.type,
+        timestamp=now,
+        day=now.date()
     )
     db.add(record)
     db.commit()
     db.refresh(record)
     return {"status": "success"}
 
+def _existing_keys(db, keys, chunk=500):
+    found = set()
+    keys = list(keys)
+    for i in range(0, len(keys), chunk):
+        found.update(k for (k,) in db.query(Attendance.idempotency_key)
+                     .filter(Attendance.idempotency_key.in_(keys[i:i + chunk])))
+    return found
+
+def _utc_naive(ts, default):
+    if ts is None:
+        return default
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts
+
+@app.post("/attendance/batch")
+def mark_attendance_batch(events: List[AttendanceEvent], db: Session = Depends(get_db)):
+    """
+    Ingest many punches (e.g. a kiosk draining its offline queue) in one
+    transaction with a single executemany. Items whose idempotency_key was
+    already stored, or repeats within the batch, are reported as "duplicate".
+    """
+    for attempt in range(2):
+        now = datetime.utcnow()
+        existing = _existing_keys(db, {e.idempotency_key for e in events if e.idempotency_key})
+        seen, rows, results = set(), [], []
+
+        for i, event in enumerate(events):
+            key = event.idempotency_key
+            if key and (key in existing or key in seen):
+                results.append({"index": i, "idempotency_key": key, "status": "duplicate"})
+                continue
+            if key:
+                seen.add(key)
+            ts = _utc_naive(event.timestamp, now)
+            rows.append({"name": event.name, "type": event.type, "timestamp": ts,
+                         "day": ts.date(), "idempotency_key": key})
+            results.append({"index": i, "idempotency_key": key, "status": "created"})
+
+        try:
+            if rows:
+                db.execute(insert(Attendance), rows)
+            db.commit()
+            break
+        except IntegrityError:
+            # A concurrent batch stored one of our keys first; re-check and retry once
+            db.rollback()
+            if attempt:
+                raise
+
+    return {
+        "status": "success",
+        "created": len(rows),
+        "duplicates": len(events) - len(rows),
+        "results": results
+    }
+
 # ================= GET =================
 @app.get("/attendance/today")
 def today_attendance(db: Session = Depends(get_db)):
-    today = date.today()
-    records = db.query(Attendance).all()
+    records = (
+        db.query(Attendance.name, Attendance.type, Attendance.timestamp)
+        .filter(Attendance.day == date.today())
+        .order_by(Attendance.id)
+        .all()
+    )
 
     return [
         {
@@ -42,24 +110,35 @@ def today_attendance(db: Session = Depends(get_db)):
             "timestamp": r.timestamp
         }
         for r in records
-        if r.timestamp.date() == today
     ]
 
 @app.get("/attendance/present")
 def present_users(db: Session = Depends(get_db)):
-    today = date.today()
-    records = db.query(Attendance).all()
-
-    latest = {}
-    for r in records:
-        if r.timestamp.date() == today:
-            latest[r.name] = r.type
+    # Latest punch per name today by event time, not arrival order: offline kiosks
+    # deliver older punches late. Resolved in SQL on the (day, name, timestamp, id) index
+    ranked = (
+        db.query(
+            Attendance.name,
+            Attendance.type,
+            func.row_number().over(
+                partition_by=Attendance.name,
+                order_by=(Attendance.timestamp.desc(), Attendance.id.desc())
+            ).label("rank")
+        )
+        .filter(Attendance.day == date.today())
+        .subquery()
+    )
+    rows = (
+        db.query(ranked.c.name)
+        .filter(ranked.c.rank == 1, ranked.c.type == "Punch-In")
+        .all()
+    )
 
-    return [name for name, t in latest.items() if t == "Punch-In"]
+    return [r.name for r in rows]
 
 @app.get("/attendance/stats")
 def stats(db: Session = Depends(get_db)):
-    users = db.query(Attendance.name).distinct().count()
+    users = db.query(func.count(func.distinct(Attendance.name))).scalar()
     present = len(present_users(db))
     percent = (present / users * 100) if users else 0
 
@@ -0,0 +1,32 @@
+"""
+Bring an existing attendance.db up to the current models.
+
+    cd backend && python migrate.py
+
+Adds the indexed `day` column (backfilled from `timestamp`), the
+`idempotency_key` column and any missing indexes, and drops superseded ones. Safe to run repeatedly; main.py also runs it at startup.
+"""
+from sqlalchemy import inspect, text
+from database import engine
+from models import Attendance, Base
+
+def migrate(bind=engine):
+    Base.metadata.create_all(bind=bind)
+
+    columns = {c["name"] for c in inspect(bind).get_columns(Attendance.__tablename__)}
+    with bind.begin() as conn:
+        if "day" not in columns:
+            conn.execute(text("ALTER TABLE attendance ADD COLUMN day DATE"))
+        if "idempotency_key" not in columns:
+            conn.execute(text("ALTER TABLE attendance ADD COLUMN idempotency_key VARCHAR"))
+        conn.execute(text("UPDATE attendance SET day = date(timestamp) WHERE day IS NULL"))
+        # Superseded by ix_attendance_day_name_timestamp (latest punch is by time, not id)
+        conn.execute(text("DROP INDEX IF EXISTS ix_attendance_day_name_id"))
+
+    # create_all() skips indexes of tables that already existed
+    for index in Attendance.__table__.indexes:
+        index.create(bind=bind, checkfirst=True)
+
+if __name__ == "__main__":
+    migrate()
+    print("attendance.db is up to date")
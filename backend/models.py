@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime
+from sqlalchemy import Column, Integer, String, DateTime, Date, Index
 from datetime import datetime
 from database import Base
 
@@ -8,4 +8,11 @@ class Attendance(Base):
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True)
     timestamp = Column(DateTime, default=datetime.utcnow)
+    day = Column(Date, index=True)  # timestamp.date(), so "today" is an index range, not a table scan
     type = Column(String)  # Punch-In / Punch-Out
+    idempotency_key = Column(String, unique=True, index=True)  # client-supplied, for safe batch retries
+
+    __table_args__ = (
+        # Covers "latest punch per name for a day": WHERE day=? PARTITION BY name ORDER BY timestamp, id
+        Index("ix_attendance_day_name_timestamp", "day", "name", "timestamp", "id"),
+    )
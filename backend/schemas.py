@@ -1,10 +1,17 @@
 from pydantic import BaseModel
 from datetime import datetime
+from typing import Optional
 
 class AttendanceCreate(BaseModel):
     name: str
     type: str
 
+class AttendanceEvent(BaseModel):
+    name: str
+    type: str
+    timestamp: Optional[datetime] = None        # when the kiosk saw the punch; defaults to arrival
+    idempotency_key: Optional[str] = None       # resending the same key is a no-op
+
 class AttendanceResponse(BaseModel):
     name: str
     type: str
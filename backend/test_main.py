@@ -0,0 +1,52 @@
+"""
+Backend API checks against a throwaway attendance.db.
+
+    cd backend && python -m pytest test_main.py
+"""
+import os
+import sys
+from datetime import date, datetime, time
+
+import pytest
+from fastapi.testclient import TestClient
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+@pytest.fixture(scope="module")
+def client(tmp_path_factory):
+    # main.py opens ./attendance.db relative to the working directory
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("backend"))
+    sys.path.insert(0, BACKEND_DIR)
+    try:
+        import main
+        yield TestClient(main.app)
+    finally:
+        os.chdir(cwd)
+
+
+def at(hour):
+    return datetime.combine(date.today(), time(hour)).isoformat()
+
+
+def punch(client, name, record_type, hour, key):
+    response = client.post("/attendance/batch", json=[
+        {"name": name, "type": record_type, "timestamp": at(hour), "idempotency_key": key}
+    ])
+    assert response.status_code == 200
+
+
+def test_present_follows_latest_punch(client):
+    punch(client, "bob", "Punch-In", 9, "bob-in")
+    assert "bob" in client.get("/attendance/present").json()
+
+
+def test_late_older_punch_does_not_override_newer_one(client):
+    punch(client, "alice", "Punch-In", 9, "alice-in")
+    punch(client, "alice", "Punch-Out", 17, "alice-out")
+    assert "alice" not in client.get("/attendance/present").json()
+
+    # An offline kiosk delivers a 12:00 Punch-In after the 17:00 Punch-Out was stored
+    punch(client, "alice", "Punch-In", 12, "alice-late")
+    assert "alice" not in client.get("/attendance/present").json()
@@ -0,0 +1,104 @@
+"""
+Detection latency and recall: fixed full-frame downscale vs adaptive ROI planning.
+
+    python benchmarks/bench_adaptive.py
+    python benchmarks/bench_adaptive.py --detector haar --fixed-scale 0.25 0.5 --hold 30
+
+Each enrollment image under --faces (one face in view) is shrunk by a random
+factor in [--min-zoom, 1] (distance from the camera), pasted at a random spot
+on a --canvas sized frame and shown for --hold consecutive frames, like a
+person standing at the door. "fixed" searches the whole frame at each
+--fixed-scale every frame; "adaptive" uses DetectionPlanner:
+padded regions around the previous frame's faces at a per-face scale, with a
+full sweep every --sweep-every frames. Recall is the fraction of frames with
+at least one detection.
+"""
+import sys
+import os
+import glob
+import time
+import argparse
+import cv2
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from recognition.detectors import make_detector
+from recognition.adaptive import AdaptiveScaler, DetectionPlanner
+
+
+def detect(detector, frame, scale, regions):
+    """ Same view logic as the engine, detection only; boxes in frame pixels """
+    if regions is None:
+        regions = [((0, frame.shape[1], frame.shape[0], 0), scale)]
+    boxes = []
+    for (top, right, bottom, left), view_scale in regions:
+        small = cv2.resize(frame[top:bottom, left:right], (0, 0), fx=view_scale, fy=view_scale)
+        for t, r, b, l in detector.detect(cv2.cvtColor(small, cv2.COLOR_BGR2RGB)):
+            boxes.append((int(t / view_scale) + top, int(r / view_scale) + left,
+                          int(b / view_scale) + top, int(l / view_scale) + left))
+    return boxes
+
+
+def run(detector, frames, plan):
+    found = 0
+    boxes = []
+    start = time.perf_counter()
+    for frame in frames:
+        boxes = plan(frame, boxes)
+        found += bool(boxes)
+    return (time.perf_counter() - start) / len(frames) * 1e3, found / len(frames)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--faces", default=os.path.join("data", "faces"))
+    parser.add_argument("--detector", default="hog")
+    parser.add_argument("--fixed-scale", type=float, nargs="+", default=[0.25, 0.5])
+    parser.add_argument("--hold", type=int, default=20, help="frames each image stays in view")
+    parser.add_argument("--sweep-every", type=int, default=10)
+    parser.add_argument("--target-face", type=int, default=64)
+    parser.add_argument("--canvas", default="1280x720", help="frame size WxH")
+    parser.add_argument("--min-zoom", type=float, default=0.4)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(os.path.join(args.faces, "**", "*.jpg"), recursive=True))
+    images = [image for image in (cv2.imread(path) for path in paths) if image is not None]
+    if not images:
+        sys.exit(f"No images under {args.faces}")
+
+    width, height = (int(v) for v in args.canvas.split("x"))
+    rng = np.random.default_rng(args.seed)
+    scenes = []
+    for image in images:
+        zoom = rng.uniform(args.min_zoom, 1.0) * min(1.0, height / image.shape[0], width / image.shape[1])
+        person = cv2.resize(image, (0, 0), fx=zoom, fy=zoom)
+        scene = np.full((height, width, 3), 90, dtype=np.uint8)
+        y = rng.integers(0, height - person.shape[0] + 1)
+        x = rng.integers(0, width - person.shape[1] + 1)
+        scene[y:y + person.shape[0], x:x + person.shape[1]] = person
+        scenes.append(scene)
+    frames = [scene for scene in scenes for _ in range(args.hold)]
+    cv2.setNumThreads(1)   # as in the engine's workers
+    detector = make_detector(args.detector)
+    print(f"{len(scenes)} scenes x {args.hold} frames at {width}x{height}, detector {args.detector}")
+
+    for scale in args.fixed_scale:
+        fixed_ms, fixed_recall = run(detector, frames, lambda frame, _: detect(detector, frame, scale, None))
+        print(f"{'fixed ' + str(scale):>10}  {fixed_ms:8.2f} ms/frame  recall {fixed_recall:.3f}")
+
+    planner = DetectionPlanner(AdaptiveScaler(target_face=args.target_face), full_sweep_every=args.sweep_every)
+
+    def adaptive(frame, boxes):
+        scale, regions = planner.plan(boxes, frame.shape)
+        boxes = detect(detector, frame, scale, regions)
+        planner.scaler.observe(boxes)
+        return boxes
+
+    adaptive_ms, adaptive_recall = run(detector, frames, adaptive)
+    print(f"{'adaptive':>10}  {adaptive_ms:8.2f} ms/frame  recall {adaptive_recall:.3f}  {planner.stats()}")
+
+
+if __name__ == "__main__":
+    main()
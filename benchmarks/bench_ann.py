@@ -0,0 +1,96 @@
+"""
+Recall@1 and latency of the IVF index against the exact gallery scan.
+
+    python benchmarks/bench_ann.py                        # synthetic 10k x 20 gallery
+    python benchmarks/bench_ann.py --gallery data/encodings.bin
+
+--gallery reads the binary store (its live generation plus pending journal
+segments); a legacy encodings.pkl is used only if no store exists next to it.
+
+Recall@1 is the fraction of probes whose IVF top-1 row is the exact top-1 row.
+"""
+import sys
+import os
+import time
+import argparse
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from recognition.gallery import GalleryMatcher
+from recognition.ann import IVFIndex
+from recognition.store import gallery_exists, gallery_path_for, read_legacy_pickle
+from recognition.journal import read_journaled
+
+
+def synthetic_gallery(identities, samples, seed=0):
+    """ dlib-like layout: identity centres ~0.9 apart, burst samples ~0.25 around them """
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(scale=0.08, size=(identities, 128)).astype(np.float32)
+    noise = rng.normal(scale=0.022, size=(identities, samples, 128)).astype(np.float32)
+    encodings = (centres[:, None, :] + noise).reshape(-1, 128)
+    names = [f"id{i}" for i in range(identities) for _ in range(samples)]
+    probes = centres[rng.integers(0, identities, 500)] + rng.normal(scale=0.022, size=(500, 128)).astype(np.float32)
+    return encodings, names, probes
+
+
+def load_gallery(path, probe_count=500, seed=0):
+    gallery_file = gallery_path_for(path)
+    if gallery_exists(gallery_file):
+        base, segments = read_journaled(gallery_file)
+        stores = [base] + [segment for _, segment in segments]
+        encodings = np.concatenate([np.asarray(store.matrix) for store in stores])
+        names = [name for store in stores for name in store.names]
+    else:
+        encodings, names = read_legacy_pickle(path)
+        encodings = np.asarray(encodings, dtype=np.float32).reshape(-1, 128)
+    if len(encodings) == 0:
+        sys.exit(f"No encodings in {path}")
+    rng = np.random.default_rng(seed)
+    picks = encodings[rng.integers(0, len(encodings), probe_count)]
+    probes = picks + rng.normal(scale=0.02, size=picks.shape).astype(np.float32)
+    return encodings, names, probes
+
+
+def timed(fn, probes, batch):
+    start = time.perf_counter()
+    results = [fn(probes[i:i + batch]) for i in range(0, len(probes), batch)]
+    elapsed = time.perf_counter() - start
+    return np.concatenate([r[0][:, 0] for r in results]), elapsed * 1000 / len(probes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--gallery", help="encodings.bin (or legacy .pkl) to benchmark instead of synthetic data")
+    parser.add_argument("--identities", type=int, default=10000)
+    parser.add_argument("--samples", type=int, default=20)
+    parser.add_argument("--nlist", type=int, default=None)
+    parser.add_argument("--batch", type=int, default=4, help="faces per frame")
+    args = parser.parse_args()
+
+    if args.gallery:
+        encodings, names, probes = load_gallery(args.gallery)
+    else:
+        encodings, names, probes = synthetic_gallery(args.identities, args.samples)
+
+    matcher = GalleryMatcher(encodings, names)
+    print(f"Gallery: {len(matcher)} vectors, {matcher.identity_count} identities")
+
+    exact_top1, exact_ms = timed(matcher.search, probes, args.batch)
+    print(f"{'exact':>12}  recall@1 1.000  {exact_ms:8.3f} ms/face")
+
+    start = time.perf_counter()
+    index = IVFIndex(matcher, nlist=args.nlist).train()
+    print(f"Trained nlist={index.nlist} in {time.perf_counter() - start:.1f}s")
+
+    for nprobe in (1, 2, 4, 8, 16, 32, 64):
+        if nprobe > index.nlist:
+            break
+        index.nprobe = nprobe
+        top1, ms = timed(index.search, probes.astype(np.float32), args.batch)
+        recall = float(np.mean(top1 == exact_top1))
+        print(f"{'nprobe=' + str(nprobe):>12}  recall@1 {recall:.3f}  {ms:8.3f} ms/face  ({exact_ms / ms:4.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
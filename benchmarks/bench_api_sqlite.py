@@ -0,0 +1,125 @@
+"""
+Mixed reader/writer load against the sqlite3 API (api/main.py).
+
+    python benchmarks/bench_api_sqlite.py --readers 6 --writers 2 --seconds 5
+
+"baseline" reproduces the old behaviour: a fresh sqlite3.connect per request,
+default rollback journal, no (date, name) index. "pooled" calls the real
+endpoint functions, which use the WAL connection pool. Both databases are
+pre-filled with the same history so /attendance/today has to find today's
+rows among older ones.
+"""
+import sys
+import os
+import time
+import sqlite3
+import argparse
+import tempfile
+import threading
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS attendance (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT, date TEXT, time TEXT, type TEXT
+    )
+"""
+
+
+def fill_history(path, days, per_day):
+    conn = sqlite3.connect(path)
+    conn.execute(SCHEMA)
+    start = date.today() - timedelta(days=days)
+    rows = [(f"user{i % 500}", (start + timedelta(days=d)).isoformat(), "09:00:00", "Punch-In")
+            for d in range(days) for i in range(per_day)]
+    conn.executemany("INSERT INTO attendance (name, date, time, type) VALUES (?, ?, ?, ?)", rows)
+    conn.commit()
+    conn.close()
+
+
+def baseline_ops(path):
+    def write(i):
+        conn = sqlite3.connect(path, check_same_thread=False)
+        conn.execute("INSERT INTO attendance (name, date, time, type) VALUES (?, ?, ?, ?)",
+                     (f"user{i}", date.today().isoformat(), "10:00:00", "Punch-In"))
+        conn.commit()
+        conn.close()
+
+    def read():
+        conn = sqlite3.connect(path, check_same_thread=False)
+        conn.execute("SELECT name, time, type FROM attendance WHERE date=?", (date.today().isoformat(),)).fetchall()
+        conn.close()
+
+    return write, read
+
+
+def pooled_ops(api):
+    def write(i):
+        api.mark_attendance(api.AttendanceItem(name=f"user{i}", type="Punch-In"))
+
+    def read():
+        api.today_attendance()
+
+    return write, read
+
+
+def run(write, read, readers, writers, seconds):
+    counts = {"reads": 0, "writes": 0, "errors": 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def loop(kind):
+        n = 0
+        while time.perf_counter() < deadline:
+            try:
+                write(n) if kind == "writes" else read()
+                key = kind
+            except sqlite3.OperationalError:
+                key = "errors"
+            n += 1
+            with lock:
+                counts[key] += 1
+
+    threads = [threading.Thread(target=loop, args=("reads",)) for _ in range(readers)]
+    threads += [threading.Thread(target=loop, args=("writes",)) for _ in range(writers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return {k: v / seconds for k, v in counts.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--readers", type=int, default=6)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--per-day", type=int, default=300)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        fill_history("baseline.db", args.days, args.per_day)
+        fill_history("attendance.db", args.days, args.per_day)
+
+        sys.path.insert(0, os.path.join(ROOT, "api"))
+        import main as api
+        api.startup()
+
+        results = {
+            "baseline": run(*baseline_ops("baseline.db"), args.readers, args.writers, args.seconds),
+            "pooled": run(*pooled_ops(api), args.readers, args.writers, args.seconds),
+        }
+        api.shutdown()
+        os.chdir(ROOT)
+
+    print(f"{args.readers} readers + {args.writers} writers, {args.days * args.per_day} history rows, {args.seconds:.0f}s each")
+    for label, r in results.items():
+        print(f"  {label:>8}: {r['reads']:9.0f} reads/s  {r['writes']:8.0f} writes/s  {r['errors']:6.1f} errors/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Rows/sec through POST /attendance (one commit per event) versus
+POST /attendance/batch (one executemany + commit per batch).
+
+    python benchmarks/bench_batch_ingest.py --app backend --events 2000
+    python benchmarks/bench_batch_ingest.py --app api --batch 500
+
+Runs in-process against a throwaway attendance.db via FastAPI's TestClient,
+so the numbers are server-side cost without network latency.
+"""
+import sys
+import os
+import time
+import uuid
+import argparse
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_app(which, workdir):
+    # Both apps open ./attendance.db relative to the working directory
+    os.chdir(workdir)
+    sys.path.insert(0, os.path.join(ROOT, which))
+    import main
+    return main.app
+
+
+def events(count):
+    return [{"name": f"user{i % 300}", "type": "Punch-In" if i % 2 == 0 else "Punch-Out",
+             "timestamp": "2024-01-15 09:00:00", "idempotency_key": uuid.uuid4().hex}
+            for i in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--app", choices=["backend", "api"], default="backend")
+    parser.add_argument("--events", type=int, default=2000)
+    parser.add_argument("--batch", type=int, default=250)
+    args = parser.parse_args()
+
+    from fastapi.testclient import TestClient
+
+    with tempfile.TemporaryDirectory() as workdir:
+        app = load_app(args.app, workdir)
+        with TestClient(app) as client:
+            single = events(args.events)
+            start = time.perf_counter()
+            for event in single:
+                client.post("/attendance", json=event).raise_for_status()
+            single_rate = args.events / (time.perf_counter() - start)
+
+            batched = events(args.events)
+            start = time.perf_counter()
+            for i in range(0, len(batched), args.batch):
+                client.post("/attendance/batch", json=batched[i:i + args.batch]).raise_for_status()
+            batch_rate = args.events / (time.perf_counter() - start)
+
+            # Replaying the same batch must be a no-op
+            replay = client.post("/attendance/batch", json=batched[:args.batch]).json()
+        os.chdir(ROOT)
+
+    print(f"{args.app}: {args.events} events")
+    print(f"  single-row POST /attendance        {single_rate:10.0f} rows/s")
+    print(f"  POST /attendance/batch (n={args.batch:<4})   {batch_rate:10.0f} rows/s  ({batch_rate / single_rate:.1f}x)")
+    print(f"  replayed batch: created={replay['created']} duplicates={replay['duplicates']}")
+
+
+if __name__ == "__main__":
+    main()
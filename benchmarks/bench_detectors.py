@@ -0,0 +1,77 @@
+"""
+Latency and recall of the face detector backends on enrollment images.
+
+    python benchmarks/bench_detectors.py
+    python benchmarks/bench_detectors.py --detectors hog haar+hog yunet --scale 0.5
+    python benchmarks/bench_detectors.py --option yunet_model=models/yunet.onnx
+
+Every image under --faces was captured with exactly one face in view, so
+recall is the fraction of images with at least one detection and "extra"
+counts images with more than one (false positives). Backends whose library
+or model file is missing are skipped with the reason.
+"""
+import sys
+import os
+import glob
+import time
+import argparse
+import cv2
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from recognition.detectors import make_detector
+
+DEFAULT_DETECTORS = ["hog", "haar", "haar+hog", "yunet", "haar+yunet", "ssd"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--faces", default=os.path.join("data", "faces"))
+    parser.add_argument("--scale", type=float, default=0.25, help="working resolution")
+    parser.add_argument("--detectors", nargs="+", default=DEFAULT_DETECTORS)
+    parser.add_argument("--option", action="append", default=[], help="backend option, e.g. ssd_confidence=0.6")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    options = {}
+    for item in args.option:
+        key, value = item.split("=", 1)
+        try:
+            value = float(value) if "." in value else int(value)
+        except ValueError:
+            pass
+        options[key] = value
+
+    paths = sorted(glob.glob(os.path.join(args.faces, "**", "*.jpg"), recursive=True))
+    images = []
+    for path in paths:
+        frame = cv2.imread(path)
+        if frame is not None:
+            small = cv2.resize(frame, (0, 0), fx=args.scale, fy=args.scale)
+            images.append(cv2.cvtColor(small, cv2.COLOR_BGR2RGB))
+    if not images:
+        sys.exit(f"No images under {args.faces}")
+    print(f"{len(images)} images at scale {args.scale} ({images[0].shape[1]}x{images[0].shape[0]})")
+
+    for spec in args.detectors:
+        try:
+            detector = make_detector(spec, **options)
+        except (ImportError, AttributeError, FileNotFoundError, RuntimeError, ValueError) as e:
+            print(f"{spec:>12}  skipped: {e}")
+            continue
+
+        detector.detect(images[0])   # warm-up (model load, first allocation)
+        found = extra = 0
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            for image in images:
+                boxes = detector.detect(image)
+                found += bool(boxes)
+                extra += len(boxes) > 1
+        runs = args.repeat * len(images)
+        ms = (time.perf_counter() - start) / runs * 1e3
+        print(f"{spec:>12}  {ms:8.2f} ms/frame  recall {found / runs:.3f}  extra {extra / runs:.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Frames/sec through RecognitionEngine for different worker counts.
+
+    python benchmarks/bench_engine.py                       # data/faces, workers 0,1,2,4,...
+    python benchmarks/bench_engine.py --workers 1 4 8 --frames 400
+
+Every image under --faces is pushed through the full pipeline (HOG detection,
+encoding, landmarks, gallery match) with block=True, so the number is
+sustained throughput rather than the drop rate of a live camera. The gallery
+is a throwaway store built from random encodings unless --gallery is given.
+"""
+import sys
+import os
+import glob
+import time
+import argparse
+import tempfile
+import cv2
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from recognition.store import write_encodings
+from recognition.engine import RecognitionEngine
+
+
+def load_frames(faces_dir):
+    paths = sorted(glob.glob(os.path.join(faces_dir, "**", "*.jpg"), recursive=True))
+    frames = [cv2.imread(p) for p in paths]
+    return [f for f in frames if f is not None]
+
+
+def throwaway_gallery(workdir, rows=2000, identities=100):
+    rng = np.random.default_rng(0)
+    path = os.path.join(workdir, "bench_gallery.bin")
+    write_encodings(path, rng.normal(scale=0.08, size=(rows, 128)).astype(np.float32),
+                    [f"id{i % identities}" for i in range(rows)])
+    return path
+
+
+def run(gallery, frames, count, workers):
+    engine = RecognitionEngine(gallery, workers=workers, index="exact")
+    try:
+        # Warm-up: worker start-up and dlib model loading are not throughput
+        for frame in frames[:max(1, workers)]:
+            engine.submit(frame)
+        engine.drain()
+
+        faces = 0
+        start = time.perf_counter()
+        for i in range(count):
+            engine.submit(frames[i % len(frames)])
+            faces += sum(len(result) for _, result in engine.poll())
+        faces += sum(len(result) for _, result in engine.drain())
+        return count / (time.perf_counter() - start), faces
+    finally:
+        engine.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--faces", default=os.path.join("data", "faces"))
+    parser.add_argument("--gallery", default=None, help="existing encodings.bin")
+    parser.add_argument("--frames", type=int, default=200)
+    parser.add_argument("--workers", type=int, nargs="+", default=None)
+    args = parser.parse_args()
+
+    frames = load_frames(args.faces)
+    if not frames:
+        sys.exit(f"No images under {args.faces}")
+    cores = os.cpu_count() or 1
+    worker_counts = args.workers or sorted({0, 1, 2, 4, cores} & set(range(cores + 1)))
+
+    with tempfile.TemporaryDirectory() as workdir:
+        gallery = args.gallery or throwaway_gallery(workdir)
+        print(f"{len(frames)} images, {args.frames} frames per run, {cores} cores")
+        baseline = None
+        for workers in worker_counts:
+            fps, faces = run(gallery, frames, args.frames, workers)
+            baseline = baseline or fps
+            print(f"workers={workers:<3} {fps:7.2f} frames/s  ({fps / baseline:4.2f}x)  faces={faces}")
+
+
+if __name__ == "__main__":
+    main()
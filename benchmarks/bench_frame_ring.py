@@ -0,0 +1,112 @@
+"""
+Cost of handing camera frames to a recognition worker process.
+
+    python benchmarks/bench_frame_ring.py
+    python benchmarks/bench_frame_ring.py --frames 2000 --height 720 --width 1280
+
+queue  : frame.copy() into a multiprocessing.Queue (allocate + pickle + pipe)
+ring   : write into a FrameRing slot, send only the FrameRef; the worker
+         reads the slot in place and checks its sequence number
+
+The worker does trivial work (one pixel read) so the numbers are transport
+overhead per frame, not recognition time.
+"""
+import sys
+import os
+import time
+import argparse
+import multiprocessing as mp
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from recognition.frame_ring import FrameRing
+
+
+def queue_worker(inbox, outbox):
+    while True:
+        frame = inbox.get()
+        if frame is None:
+            break
+        outbox.put(int(frame[0, 0, 0]))
+
+
+def ring_worker(inbox, outbox):
+    ring = None
+    while True:
+        ref = inbox.get()
+        if ref is None:
+            break
+        ring = ring or FrameRing.attach(ref)
+        view = ring.view(ref)
+        value = int(view[0, 0, 0]) if view is not None else -1
+        outbox.put(value if ring.valid(ref) else -1)
+    if ring is not None:
+        ring.close()
+
+
+def run_queue(frames, count):
+    inbox, outbox = mp.Queue(maxsize=4), mp.Queue()
+    worker = mp.Process(target=queue_worker, args=(inbox, outbox))
+    worker.start()
+    start = time.perf_counter()
+    for i in range(count):
+        inbox.put(frames[i % len(frames)].copy())
+    for _ in range(count):
+        outbox.get()
+    elapsed = time.perf_counter() - start
+    inbox.put(None)
+    worker.join()
+    return elapsed
+
+
+def run_ring(frames, count, slots=8):
+    ring = FrameRing(frames[0].shape, slots=slots)
+    inbox, outbox = mp.Queue(maxsize=4), mp.Queue()
+    worker = mp.Process(target=ring_worker, args=(inbox, outbox))
+    worker.start()
+    in_flight = []
+    stale = 0
+    start = time.perf_counter()
+    for i in range(count):
+        # Same lease discipline as the scanners: at most slots - 1 frames out
+        if len(in_flight) >= slots - 1:
+            stale += outbox.get() < 0
+            ring.release(in_flight.pop(0))
+        ref = ring.write(frames[i % len(frames)])   # stands in for cap.read(slot_view)
+        ring.lease(ref)
+        in_flight.append(ref)
+        inbox.put(ref)
+    for ref in in_flight:
+        stale += outbox.get() < 0
+        ring.release(ref)
+    elapsed = time.perf_counter() - start
+    inbox.put(None)
+    worker.join()
+    ring.close()
+    return elapsed, stale
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=1000)
+    parser.add_argument("--height", type=int, default=480)
+    parser.add_argument("--width", type=int, default=640)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    frames = [rng.integers(0, 255, (args.height, args.width, 3), dtype=np.uint8) for _ in range(4)]
+    print(f"{args.frames} frames of {args.width}x{args.height}x3 ({frames[0].nbytes / 1e6:.1f} MB each)")
+
+    elapsed = run_queue(frames, args.frames)
+    queue_us = elapsed / args.frames * 1e6
+    print(f"{'queue':>6}  {queue_us:8.1f} us/frame  {args.frames / elapsed:8.0f} frames/s")
+
+    elapsed, stale = run_ring(frames, args.frames)
+    ring_us = elapsed / args.frames * 1e6
+    print(f"{'ring':>6}  {ring_us:8.1f} us/frame  {args.frames / elapsed:8.0f} frames/s  "
+          f"({queue_us / ring_us:4.1f}x, stale={stale})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Per-event latency of bare requests.post (new connection per call) versus the
+pooled keep-alive ApiClient, against a local HTTP/1.1 stub server.
+
+    python benchmarks/bench_http_client.py --events 500
+
+Over loopback this isolates TCP setup cost; over the internet (and with TLS
+to the Render deployment) the saving per event is several round trips larger.
+"""
+import sys
+import os
+import time
+import json
+import argparse
+import threading
+import requests
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cloud.client import ApiClient
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"   # keep-alive
+    disable_nagle_algorithm = True  # headers and body go out as separate writes
+    connections = 0
+
+    def setup(self):
+        super().setup()
+        StubHandler.connections += 1
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        body = json.dumps({"status": "success"}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def timed(send, events):
+    start = time.perf_counter()
+    for i in range(events):
+        send({"name": f"user{i}", "type": "Punch-In"}).raise_for_status()
+    return (time.perf_counter() - start) * 1000 / events
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=500)
+    parser.add_argument("--http2", action="store_true", help="use httpx/h2 if installed (stub speaks HTTP/1.1 only)")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+
+    StubHandler.connections = 0
+    bare_ms = timed(lambda p: requests.post(base + "/attendance", json=p, timeout=15), args.events)
+    bare_conns = StubHandler.connections
+
+    client = ApiClient(base, http2=args.http2)
+    StubHandler.connections = 0
+    pooled_ms = timed(lambda p: client.post("/attendance", json=p), args.events)
+    pooled_conns = StubHandler.connections
+
+    server.shutdown()
+    print(f"{args.events} events against {base}")
+    print(f"  bare requests.post   {bare_ms:7.3f} ms/event   {bare_conns:5d} connections")
+    print(f"  pooled ApiClient     {pooled_ms:7.3f} ms/event   {pooled_conns:5d} connections   "
+          f"saved {bare_ms - pooled_ms:.3f} ms/event")
+    print(f"  client stats: {client.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Per-stage timing of the recognition pipeline: separate vs single-pass landmarks.
+
+    python benchmarks/bench_landmarks.py
+    python benchmarks/bench_landmarks.py --faces data/faces --scale 0.5 --repeat 3
+
+separate : face_encodings() on the working image (5-point shape inside)
+           + face_landmarks() on the full frame (68-point shape again)
+fused    : encode_faces() (same 5-point alignment) plus one 68-point shape
+           on the working image for the liveness landmarks
+
+Also reports the largest distance between the two descriptors of each face,
+which must be 0: probes have to match how the gallery was enrolled.
+"""
+import sys
+import os
+import glob
+import time
+import argparse
+import cv2
+import numpy as np
+import face_recognition
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from recognition.landmarks import encode_faces, landmark_dict, predict_shapes, shape_points
+
+
+def timed(stats, stage, fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    stats[stage] = stats.get(stage, 0.0) + time.perf_counter() - start
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--faces", default=os.path.join("data", "faces"))
+    parser.add_argument("--scale", type=float, default=0.25, help="working resolution")
+    parser.add_argument("--repeat", type=int, default=1)
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(os.path.join(args.faces, "**", "*.jpg"), recursive=True))
+    frames = [f for f in (cv2.imread(p) for p in paths) if f is not None]
+    if not frames:
+        sys.exit(f"No images under {args.faces}")
+
+    stats, deltas, faces = {}, [], 0
+    up = 1.0 / args.scale
+    for _ in range(args.repeat):
+        for frame in frames:
+            small = cv2.resize(frame, (0, 0), fx=args.scale, fy=args.scale)
+            rgb_small = cv2.cvtColor(small, cv2.COLOR_BGR2RGB)
+            locs = timed(stats, "detect", face_recognition.face_locations, rgb_small)
+            if not locs:
+                continue
+            faces += len(locs)
+
+            # Separate: encoder's own shape + full-resolution landmarks
+            old_encs = timed(stats, "separate: encode", face_recognition.face_encodings, rgb_small, locs)
+            full_locs = [tuple(int(v * up) for v in loc) for loc in locs]
+            timed(stats, "separate: landmarks", face_recognition.face_landmarks, frame, full_locs)
+
+            # Fused: enrollment-compatible descriptors + one 68-point shape per face
+            new_encs = timed(stats, "fused: encode", encode_faces, rgb_small, locs)
+            shapes = timed(stats, "fused: shape", predict_shapes, rgb_small, locs)
+            timed(stats, "fused: landmarks", lambda: [landmark_dict(shape_points(s, up)) for s in shapes])
+
+            deltas += [float(np.linalg.norm(a - b)) for a, b in zip(old_encs, new_encs)]
+
+    n = len(frames) * args.repeat
+    print(f"{n} frames, {faces} faces, working scale {args.scale}")
+    for stage, total in stats.items():
+        print(f"{stage:>22}  {total / n * 1e3:8.2f} ms/frame")
+    separate = sum(v for k, v in stats.items() if k.startswith("separate"))
+    fused = sum(v for k, v in stats.items() if k.startswith("fused"))
+    if fused:
+        print(f"{'encode+landmarks':>22}  separate {separate / n * 1e3:.2f} ms, fused {fused / n * 1e3:.2f} ms "
+              f"({separate / fused:.1f}x)")
+    if deltas:
+        print(f"{'descriptor delta':>22}  max {np.max(deltas):.6f} (must be 0)")
+
+
+if __name__ == "__main__":
+    main()
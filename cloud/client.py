@@ -0,0 +1,129 @@
+"""
+Shared keep-alive HTTP client for scanner/dashboard -> backend traffic.
+
+One ApiClient per base URL keeps a pool of persistent connections, so every
+punch or dashboard refresh reuses an open TCP (and TLS, for the Render
+deployment) connection instead of opening a new one. HTTP/2 is available via
+httpx when it is installed with its h2 extra (pip install "httpx[http2]");
+otherwise requests + urllib3 pooling is used. stats() exposes how many
+connections were opened versus requests served.
+"""
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+POOL_SIZE = 4
+CONNECT_TIMEOUT = 3.05
+READ_TIMEOUT = 15
+
+
+class ApiClient:
+    def __init__(self, base_url, pool_size=POOL_SIZE, connect_timeout=CONNECT_TIMEOUT,
+                 read_timeout=READ_TIMEOUT, http2=False):
+        self.base_url = base_url.rstrip("/")
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.requests = 0
+        self.errors = 0
+        self._streams = set()          # httpx: distinct network streams seen
+        self._lock = threading.Lock()
+
+        self.http2 = bool(http2 and httpx is not None)
+        if self.http2:
+            try:
+                self._client = httpx.Client(
+                    http2=True,
+                    limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+                    timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+                )
+            except ImportError:
+                # httpx without the h2 package
+                self.http2 = False
+        if not self.http2:
+            self._session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+            self._session.mount("http://", adapter)
+            self._session.mount("https://", adapter)
+            self._adapter = adapter
+
+    def _timeout(self, timeout):
+        if timeout is None:
+            return (self.connect_timeout, self.read_timeout)
+        return timeout
+
+    def request(self, method, path, timeout=None, **kwargs):
+        """ Returns a response with .status_code/.text/.json(); raises requests exceptions on failure """
+        url = self.base_url + path
+        with self._lock:
+            self.requests += 1
+        try:
+            if not self.http2:
+                return self._session.request(method, url, timeout=self._timeout(timeout), **kwargs)
+
+            if isinstance(timeout, tuple):
+                timeout = httpx.Timeout(timeout[1], connect=timeout[0])
+            response = self._client.request(method, url, timeout=timeout or httpx.USE_CLIENT_DEFAULT, **kwargs)
+            stream = response.extensions.get("network_stream")
+            if stream is not None:
+                with self._lock:
+                    self._streams.add(id(stream))
+            return response
+        except requests.exceptions.RequestException:
+            with self._lock:
+                self.errors += 1
+            raise
+        except Exception as e:
+            if httpx is not None and isinstance(e, httpx.HTTPError):
+                with self._lock:
+                    self.errors += 1
+                # Callers only need to handle one exception family
+                raise requests.exceptions.ConnectionError(str(e)) from e
+            raise
+
+    def get(self, path, **kwargs):
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request("POST", path, **kwargs)
+
+    def connections_opened(self):
+        if self.http2:
+            return len(self._streams)
+        pools = self._adapter.poolmanager.pools
+        return sum(pools[key].num_connections for key in list(pools.keys()))
+
+    def stats(self):
+        opened = self.connections_opened()
+        return {
+            "transport": "httpx/h2" if self.http2 else "requests/http1.1",
+            "requests": self.requests,
+            "errors": self.errors,
+            "connections_opened": opened,
+            "reused": max(0, self.requests - self.errors - opened),
+            "reuse_ratio": round(1 - opened / self.requests, 3) if self.requests else 0.0,
+        }
+
+    def close(self):
+        if self.http2:
+            self._client.close()
+        else:
+            self._session.close()
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(base_url, **options):
+    """ One pooled client per base URL and configuration within a process """
+    key = (base_url.rstrip("/"), tuple(sorted(options.items())))
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = _clients[key] = ApiClient(base_url, **options)
+        return client
@@ -0,0 +1,144 @@
+"""
+Durable offline outbox for attendance sync.
+
+The scanner calls Outbox.enqueue(), which is one local SQLite insert, and goes
+straight back to the camera loop. OutboxSender drains the queue on its own
+thread in batches through POST /attendance/batch, backing off exponentially
+while the backend is unreachable. Rows are deleted only once the server has
+acknowledged them, and every event carries an idempotency key so re-sending
+after a timeout never double-counts a punch. A batch the server rejects as
+malformed (4xx) is bisected so only the offending events are parked.
+"""
+import json
+import time
+import uuid
+import random
+import sqlite3
+import threading
+import requests
+
+BATCH_SIZE = 100
+BASE_BACKOFF = 1.0
+MAX_BACKOFF = 300.0
+IDLE_WAIT = 5.0
+
+
+class Outbox:
+    def __init__(self, path):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=FULL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                payload TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt REAL NOT NULL DEFAULT 0
+            )
+        """)
+        self._lock = threading.Lock()
+        self.wakeup = threading.Event()
+
+    def enqueue(self, payload):
+        """ Persist one event; adds an idempotency key if the caller did not """
+        payload = dict(payload)
+        payload.setdefault("idempotency_key", uuid.uuid4().hex)
+        with self._lock:
+            self._conn.execute("INSERT INTO outbox (payload) VALUES (?)", (json.dumps(payload),))
+        self.wakeup.set()
+        return payload["idempotency_key"]
+
+    def due(self, limit=BATCH_SIZE):
+        """ [(id, payload)] ready to send, oldest first """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, payload FROM outbox WHERE next_attempt <= ? ORDER BY id LIMIT ?",
+                (time.time(), limit)
+            ).fetchall()
+        return [(row_id, json.loads(payload)) for row_id, payload in rows]
+
+    def ack(self, ids):
+        with self._lock:
+            self._conn.executemany("DELETE FROM outbox WHERE id = ?", [(i,) for i in ids])
+
+    def defer(self, ids, delay):
+        """ Push rows back (e.g. rejected by the server) without dropping them """
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE outbox SET attempts = attempts + 1, next_attempt = ? WHERE id = ?",
+                [(time.time() + delay, i) for i in ids]
+            )
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+
+
+class OutboxSender(threading.Thread):
+    """ Background drainer: batches, exponential backoff with jitter, never drops """
+
+    def __init__(self, outbox, client, batch_path="/attendance/batch", batch_size=BATCH_SIZE,
+                 base_backoff=BASE_BACKOFF, max_backoff=MAX_BACKOFF):
+        super().__init__(daemon=True)
+        self.outbox = outbox
+        self.client = client          # cloud.client.ApiClient (pooled keep-alive)
+        self.batch_path = batch_path
+        self.batch_size = batch_size
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.failures = 0
+        self.sent = 0
+        self._stop_event = threading.Event()
+
+    def backoff(self):
+        delay = min(self.max_backoff, self.base_backoff * (2 ** min(self.failures, 16)))
+        return delay * random.uniform(0.5, 1.0)
+
+    def send_batch(self):
+        """ Send one batch; returns the number of rows the server accepted """
+        batch = self.outbox.due(self.batch_size)
+        if not batch:
+            return 0
+        return self._send(batch)
+
+    def _send(self, batch):
+        ids = [row_id for row_id, _ in batch]
+        response = self.client.post(self.batch_path, json=[payload for _, payload in batch])
+        if response.status_code == 200:
+            # "created" and "duplicate" both mean the server has the punch
+            self.outbox.ack(ids)
+            self.sent += len(ids)
+            return len(ids)
+        if 400 <= response.status_code < 500 and response.status_code not in (408, 429):
+            # Rejected content: one bad event fails the whole request, so bisect
+            # until only the offending rows are left and park just those
+            if len(batch) > 1:
+                half = len(batch) // 2
+                return self._send(batch[:half]) + self._send(batch[half:])
+            print(f"⚠️ Cloud rejected event {ids[0]} ({response.status_code}): {response.text[:200]}")
+            self.outbox.defer(ids, self.max_backoff)
+            return 0
+        raise requests.exceptions.HTTPError(f"Cloud error {response.status_code}")
+
+    def run(self):
+        while not self._stop_event.is_set():
+            self.outbox.wakeup.clear()
+            try:
+                if self.send_batch():
+                    self.failures = 0
+                    continue
+            except requests.exceptions.RequestException as e:
+                self.failures += 1
+                delay = self.backoff()
+                if self.failures == 1 or self.failures % 10 == 0:
+                    print(f"⚠️ Cloud sync unavailable ({e}); {len(self.outbox)} punches queued, retrying in {delay:.0f}s")
+                # New punches must not cut the backoff short
+                self._stop_event.wait(delay)
+                continue
+
+            self.outbox.wakeup.wait(IDLE_WAIT)
+
+    def stop(self):
+        self._stop_event.set()
+        self.outbox.wakeup.set()
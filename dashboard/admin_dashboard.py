@@ -1,8 +1,12 @@
+import os
+import sys
 import streamlit as st
-import requests
 import pandas as pd
 from datetime import datetime
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from cloud.client import ApiClient
+
 API_BASE = "https://face-attendance-system-1-635m.onrender.com"
 
 st.set_page_config(page_title="Attendance Dashboard", page_icon="📊", layout="wide")
@@ -19,14 +23,20 @@ st.markdown("""
     </style>
     """, unsafe_allow_html=True)
 
+@st.cache_resource
+def api_client():
+    # One keep-alive (TLS) connection pool across Streamlit reruns
+    return ApiClient(API_BASE)
+
 st.title("📊 Face Attendance Dashboard")
 st.markdown("---")
 
 try:
     # Fetch Data
-    stats = requests.get(f"{API_BASE}/attendance/stats").json()
-    present = requests.get(f"{API_BASE}/attendance/present").json()
-    today_data = requests.get(f"{API_BASE}/attendance/today").json()
+    client = api_client()
+    stats = client.get("/attendance/stats").json()
+    present = client.get("/attendance/present").json()
+    today_data = client.get("/attendance/today").json()
 
     # Metrics Row
     col1, col2, col3 = st.columns(3)
@@ -7,11 +7,16 @@ import json
 import cv2
 import numpy as np
 import os
-import pickle
+import sys
 import random
 import plotly.graph_objects as go
 from datetime import datetime
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from recognition.store import gallery_path_for
+from recognition.journal import append_enrollment
+from cloud.client import ApiClient
+
 # API Config
 API_BASE = "http://127.0.0.1:8000"
 
@@ -93,10 +98,15 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # Helper Functions
+@st.cache_resource
+def api_client():
+    # Survives Streamlit reruns, so refreshes reuse keep-alive connections
+    return ApiClient(API_BASE, read_timeout=3)
+
 @st.cache_data(ttl=5)
 def get_api_data(endpoint):
     try:
-        response = requests.get(f"{API_BASE}{endpoint}", timeout=3)
+        response = api_client().get(endpoint)
         return response.json() if response.status_code == 200 else None
     except: return None
 
@@ -240,6 +250,7 @@ elif "Face Registration" in menu:
                 else:
                     # Burst logic (Integrated from user request)
                     import face_recognition
+                    from recognition.landmarks import encode_faces
                     cap = cv2.VideoCapture(0)
                     count = 0
                     local_encs = []
@@ -252,7 +263,7 @@ elif "Face Registration" in menu:
                         if key == ord('c') or count > 0:
                             rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
                             locs = face_recognition.face_locations(rgb)
-                            encs = face_recognition.face_encodings(rgb, locs)
+                            encs = encode_faces(rgb, locs)
                             if len(encs) == 1:
                                 local_encs.append(encs[0])
                                 count += 1
@@ -264,13 +275,7 @@ elif "Face Registration" in menu:
                     
                     if len(local_encs) == 20:
                         # Save logic
-                        p = "data/encodings.pkl"
-                        data = {"encodings": [], "names": []}
-                        if os.path.exists(p) and os.path.getsize(p) > 0:
-                            with open(p, "rb") as f: data = pickle.load(f)
-                        data["encodings"].extend(local_encs)
-                        data["names"].extend([reg_name] * 20)
-                        with open(p, "wb") as f: pickle.dump(data, f)
+                        append_enrollment(gallery_path_for("data/encodings.pkl"), local_encs, [reg_name] * 20)
                         st.success(f"Successfully Enrolled {reg_name} (20 Biometric Samples)")
                         st.balloons()
 
@@ -7,10 +7,8 @@ import customtkinter as ctk
 from tkinter import messagebox, filedialog
 import cv2
 import face_recognition
-import pickle
 import os
 import numpy as np
-import pandas as pd
 import time
 from datetime import datetime
 import subprocess
@@ -18,49 +16,60 @@ import threading
 import queue
 from PIL import Image, ImageTk
 from security.liveness import LivenessDetector
+from security.sessions import SessionManager
+from recognition.store import gallery_path_for
+from recognition.journal import BackgroundCompactor, append_enrollment
+from recognition.service import get_gallery_service
+from recognition.tracker import FaceTracker
+from recognition.motion import MotionGate
+from recognition.adaptive import AdaptiveScaler, DetectionPlanner
+from recognition.engine import RecognitionEngine, default_workers, track_faces
+from recognition.capture import CameraStream
+from recognition.landmarks import encode_faces
+from records.punch_state import get_punch_index
 from alerts.whatsapp import send_whatsapp_alert
 
 # ================= CONFIG & PATHS =================
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 ENCODINGS_FILE = os.path.join(BASE_DIR, "data", "encodings.pkl")
+GALLERY_FILE = gallery_path_for(ENCODINGS_FILE)
 ATTENDANCE_FILE = os.path.join(BASE_DIR, "attendance", "attendance.csv")
 
+# Gallery search: "exact" full scan, "prototype" centroid shortlist + exact
+# re-check, or "ivf" approximate index for very large galleries
+MATCH_INDEX = "prototype"
+PROTOTYPE_SHORTLIST = 3
+ANN_NPROBE = 8
+GALLERY_POLL_SECONDS = 2.0   # how quickly new enrollments reach a running scanner
+MATCH_THRESHOLD = 0.45
+TRACK_REVERIFY_FRAMES = 15   # re-encode an identified face at least this often
+MOTION_SENSITIVITY = 0.01    # skip detection on static, empty scenes
+MOTION_MAX_IDLE_SECONDS = 2.0
+RECOGNITION_WORKERS = default_workers()   # detection/encoding processes
+
+# Face detector: "hog", "haar", "yunet", "ssd", or a "proposer+confirmer" cascade
+# such as "haar+hog". DNN model paths: e.g. {"yunet_model": "models/yunet.onnx"}
+DETECTOR = "hog"
+DETECTOR_OPTIONS = {}
+TARGET_FACE_PX = 64           # working scale follows face sizes, within the budget below
+DETECTION_BUDGET_MS = 80.0
+FULL_SWEEP_EVERY = 10         # search only around tracked faces in between full sweeps
+CONSENSUS_FRAMES = 3          # consecutive verified results before a punch
+PUNCH_COOLDOWN_SECONDS = 10   # per identity; other people keep being processed
+
 ctk.set_appearance_mode("Dark")
 ctk.set_default_color_theme("blue")
 
 # ================= DATA HELPERS =================
 def load_data():
-    if os.path.exists(ENCODINGS_FILE) and os.path.getsize(ENCODINGS_FILE) > 0:
-        with open(ENCODINGS_FILE, "rb") as f:
-            try:
-                data = pickle.load(f)
-                if isinstance(data, dict):
-                    # Standardize to new sequence structure
-                    if "encodings" in data and "names" in data:
-                        # Filter for valid dimensions
-                        valid_indices = [i for i, enc in enumerate(data["encodings"]) if hasattr(enc, "shape") and enc.shape == (128,)]
-                        return {
-                            "encodings": [data["encodings"][i] for i in valid_indices],
-                            "names": [data["names"][i] for i in valid_indices]
-                        }
-                    else:
-                        # Old structure {name: [encs]}
-                        new_data = {"encodings": [], "names": []}
-                        for name, encs in data.items():
-                            if isinstance(encs, list):
-                                for enc in encs:
-                                    if hasattr(enc, "shape") and enc.shape == (128,):
-                                        new_data["encodings"].append(enc)
-                                        new_data["names"].append(name)
-                        return new_data
-            except:
-                pass
-    return {"encodings": [], "names": []}
-
-def save_data(data):
-    os.makedirs(os.path.dirname(ENCODINGS_FILE), exist_ok=True)
-    with open(ENCODINGS_FILE, "wb") as f:
-        pickle.dump(data, f)
+    """ Shared, hot-reloading gallery; the legacy pickle is migrated on first run """
+    return get_gallery_service(GALLERY_FILE, ENCODINGS_FILE, index=MATCH_INDEX,
+                               shortlist=PROTOTYPE_SHORTLIST, nprobe=ANN_NPROBE,
+                               poll_interval=GALLERY_POLL_SECONDS)
+
+def save_data(encodings, names):
+    """ Journal only the new samples; the base gallery is compacted in the background """
+    append_enrollment(GALLERY_FILE, encodings, names)
 
 # ================= MAIN APP CLASS =================
 class FaceAttendanceApp(ctk.CTk):
@@ -75,18 +84,22 @@ class FaceAttendanceApp(ctk.CTk):
         self.grid_rowconfigure(0, weight=1)
 
         # Initialize data
-        self.data = load_data()
+        self.gallery = load_data()
+        self.compactor = BackgroundCompactor(GALLERY_FILE, ENCODINGS_FILE)
+        self.compactor.start()
         self.running_camera = False
-        self.cap = None
+        self.stream = None
         
         # Async Processing
         self.frame_queue = queue.Queue(maxsize=1)
         self.result_queue = queue.Queue(maxsize=1)
         self.current_results = []
         self.recognition_active = False
+        self.scanner_error = None   # set by the worker when recognition dies, shown by the Tk loop
         
-        # Accuracy Tuning: Multi-frame consensus
-        self.consensus_count = {} # {name: count}
+        # Punch banners shown over the camera feed: [(text, until)], fed by the worker
+        self.toasts = []
+        self.punch_events = queue.Queue()
         
         # Sidebar
         self.sidebar_frame = ctk.CTkFrame(self, width=200, corner_radius=0)
@@ -136,11 +149,10 @@ class FaceAttendanceApp(ctk.CTk):
         stats_frame.grid_columnconfigure((0, 1, 2), weight=1)
 
         # Metrics cards
-        self.create_metric_card(stats_frame, "Total Identities", len(set(self.data["names"])), 0)
+        self.create_metric_card(stats_frame, "Total Identities", self.gallery.matcher().identity_count, 0)
         
         today = datetime.now().strftime("%Y-%m-%d")
-        log_df = pd.read_csv(ATTENDANCE_FILE) if os.path.exists(ATTENDANCE_FILE) else pd.DataFrame()
-        today_count = log_df[log_df["Date"] == today]["Name"].nunique() if not log_df.empty else 0
+        today_count = get_punch_index(ATTENDANCE_FILE).present_count(today)
         self.create_metric_card(stats_frame, "Marked Today", today_count, 1)
         
         self.create_metric_card(stats_frame, "System Status", "SECURE", 2)
@@ -169,112 +181,176 @@ class FaceAttendanceApp(ctk.CTk):
 
     def start_camera_recognition(self):
         if not self.running_camera:
-            self.cap = cv2.VideoCapture(0)
             self.running_camera = True
-            self.liveness = LivenessDetector()
+            # One verification session (challenge, blink, consensus) per tracked face
+            self.sessions = SessionManager(liveness=LivenessDetector(), consensus_frames=CONSENSUS_FRAMES,
+                                           cooldown_seconds=PUNCH_COOLDOWN_SECONDS)
+            self.tracker = FaceTracker(MATCH_THRESHOLD, reverify_every=TRACK_REVERIFY_FRAMES)
+            self.motion_gate = MotionGate(sensitivity=MOTION_SENSITIVITY, max_idle_seconds=MOTION_MAX_IDLE_SECONDS)
+            self.planner = DetectionPlanner(AdaptiveScaler(target_face=TARGET_FACE_PX, budget_ms=DETECTION_BUDGET_MS),
+                                            full_sweep_every=FULL_SWEEP_EVERY)
+            try:
+                self.engine = RecognitionEngine(GALLERY_FILE, ENCODINGS_FILE, workers=RECOGNITION_WORKERS,
+                                                threshold=MATCH_THRESHOLD, index=MATCH_INDEX,
+                                                shortlist=PROTOTYPE_SHORTLIST, nprobe=ANN_NPROBE,
+                                                poll_interval=GALLERY_POLL_SECONDS,
+                                                detector=DETECTOR, detector_options=DETECTOR_OPTIONS)
+            except (ValueError, FileNotFoundError, RuntimeError) as e:
+                # Bad DETECTOR / DETECTOR_OPTIONS, or a missing model file
+                self.running_camera = False
+                messagebox.showerror("Scanner", f"Could not start recognition: {e}")
+                return
+            # Capture thread writes into shared memory; the engine's workers read frames in place.
+            # Slots: engine's pending frames + frame queue + worker's frame + latest + one being written
+            self.stream = CameraStream(0, slots=self.engine.max_pending + 4).start()
+            self.display = np.empty(self.stream.shape, dtype=np.uint8) if self.stream.isOpened() else None
             self.btn_action.configure(text="Stop Scanner", fg_color="red")
             
             # Start Background Worker
             self.recognition_active = True
-            threading.Thread(target=self.recognition_worker, daemon=True).start()
+            # A fresh hand-off queue per session: refs into a previous session's (unlinked) ring
+            # must never reach this worker, nor this session's refs the old one
+            self.frame_queue = queue.Queue(maxsize=1)
+            threading.Thread(target=self.recognition_worker, args=(self.engine, self.stream, self.frame_queue),
+                             daemon=True).start()
             
             self.update_camera_frame()
 
-    def recognition_worker(self):
-        """ Background thread for heavy AI processing """
-        while self.recognition_active:
+    def recognition_worker(self, engine, stream, frames):
+        """ Background thread: feeds the process-pool engine, then tracks and checks liveness """
+        refs = {}   # frame_id -> leased ring slot, kept for the liveness checks on its result
+        ring = stream.ring
+        # A restarted scanner gets a new engine; this thread then winds down
+        while self.recognition_active and engine is self.engine:
             try:
-                frame = self.frame_queue.get(timeout=1)
-                # 1. Resize for speed
-                small_frame = cv2.resize(frame, (0, 0), fx=0.25, fy=0.25)
-                rgb_small_frame = cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB)
-
-                # 2. Detect & Encode
-                locs = face_recognition.face_locations(rgb_small_frame)
-                encs = face_recognition.face_encodings(rgb_small_frame, locs)
-                
-                # Upscale locations for landmarks on original frame
-                upscaled_locations = [(t*4, r*4, b*4, l*4) for t, r, b, l in locs]
-                landmarks = face_recognition.face_landmarks(frame, upscaled_locations)
-
-                results = []
-                for enc, loc, landmark in zip(encs, locs, landmarks):
-                    name = "Unknown"
-                    challenge_ok = self.liveness.verify_challenge(landmark, frame.shape[1])
-                    
-                    if self.data["encodings"]:
-                        dists = face_recognition.face_distance(self.data["encodings"], enc)
-                        # Increased threshold to 0.45 for better accuracy
-                        if np.min(dists) < 0.45:
-                            name = self.data["names"][np.argmin(dists)]
-                    
-                    # Liveness Check (Motion/Replay)
-                    motion_ok = self.liveness.detect_motion(frame) and self.liveness.detect_replay(frame)
-                    
-                    results.append({
-                        "name": name, 
-                        "loc": [v * 4 for v in loc], 
-                        "challenge_ok": challenge_ok,
-                        "motion_ok": motion_ok
-                    })
+                ref = frames.get(timeout=0.05)
+            except queue.Empty:
+                ref = None
+
+            if ref is not None and ref.name != ring.name:
+                ref = None   # not our ring: nothing to release here
+            frame = None if ref is None else ring.view(ref)
+            if ref is not None and frame is None:
+                ring.release(ref)   # slot already reused
+                ref = None
+
+            if ref is not None:
+                # 1. Pick the regions and working scale (around tracked faces, or a full sweep)
+                # 2. Detect/encode/landmark in the pool; trusted tracks are not re-encoded
+                frame_id = None
+                if self.motion_gate.should_process(frame, active=bool(self.tracker.tracks)):
+                    scale, regions = self.planner.plan([t.box for t in self.tracker.tracks], frame.shape,
+                                                       engine.ms_per_mpix)
+                    try:
+                        frame_id = engine.submit(ref, skip_boxes=self.tracker.trusted_boxes(), block=False,
+                                                 scale=scale, regions=regions)
+                    except RuntimeError as e:
+                        self._engine_failed(e)
+                        break
+                elif not self.result_queue.full():
+                    self.result_queue.put([])
+                if frame_id is None:
+                    ring.release(ref)
+                else:
+                    refs[frame_id] = ref
+
+            # 3. Results come back in frame order
+            try:
+                ready = engine.poll()
+            except RuntimeError as e:
+                self._engine_failed(e)
+                break
+            for frame_id, faces in ready:
+                ref = refs.pop(frame_id)
+                frame = None if faces is None else ring.view(ref)
+                if frame is None:
+                    ring.release(ref)
+                    continue
+                self.planner.observe(faces)
+                tracks = track_faces(self.tracker, faces)
+
+                # Liveness (motion/replay per crop, each face's own challenge) and consensus
+                boxes = [face["loc"] for face in faces]
+                points = np.stack([face["points"] for face in faces]) if faces else np.empty((0, 68, 2))
+                results = self.sessions.update(tracks, points, frame, boxes)
+
+                for res, box in zip(results, boxes):
+                    res["loc"] = box
+                    if res["punch"]:
+                        record = self.mark_attendance(res["name"])
+                        if record is None:
+                            continue
+                        self.punch_events.put(f"{record}: {res['name']}")
+                        send_whatsapp_alert(res["name"], record)
                 
+                ring.release(ref)
+
                 # Update shared results
                 if not self.result_queue.full():
                     self.result_queue.put(results)
-                    
-            except queue.Empty:
-                continue
+
+        engine.close()
+        stream.release()
+        print(f"[INFO] Camera stopped: {stream.stats()} | detection: {self.planner.stats()}")
+
+    def _engine_failed(self, error):
+        # Runs on the recognition worker: stop the scanner, the Tk loop reports it
+        print(f"[ERROR] Recognition stopped: {error}")
+        self.scanner_error = str(error)
+        self.running_camera = False
+        self.recognition_active = False
 
     def update_camera_frame(self):
+        if self.scanner_error is not None:
+            error, self.scanner_error = self.scanner_error, None
+            messagebox.showerror("Scanner", f"Recognition stopped: {error}")
         if self.running_camera:
-            ret, frame = self.cap.read()
-            if ret:
-                # 1. Push frame to worker (if worker is ready)
+            # Newest frame from the capture thread; never blocks the Tk loop
+            ref = self.stream.read(timeout=0) if self.stream.isOpened() else None
+            if ref is None:
+                self.cam_label.after(5, self.update_camera_frame)
+            else:
+                # Overlays go on a private canvas, never on the shared slot
+                frame = self.display
+                np.copyto(frame, self.stream.view(ref))
+
+                # 1. Hand the slot (and its lease) to the worker, if the worker is ready
                 if not self.frame_queue.full():
-                    self.frame_queue.put(frame.copy())
+                    self.frame_queue.put(ref)
+                else:
+                    self.stream.release_frame(ref)
 
                 # 2. Pull latest results (Non-blocking)
                 try:
                     self.current_results = self.result_queue.get_nowait()
                 except queue.Empty:
                     pass
+                while not self.punch_events.empty():
+                    self.toasts.append((self.punch_events.get_nowait(), time.time() + 3))
 
                 # 3. Draw overlays using last known results
                 for res in self.current_results:
                     name = res["name"]
                     top, right, bottom, left = res["loc"]
-                    challenge_ok = res["challenge_ok"]
-                    motion_ok = res["motion_ok"]
-                    
+                    state = res["state"]
+
+                    status = name
                     color = (255, 0, 0) # Red (Unknown/Fail)
-                    
-                    if motion_ok:
-                        if name != "Unknown":
-                            if challenge_ok:
-                                color = (0, 255, 0) # Green (Verified)
-                                
-                                # ACCURACY: Multi-frame consensus before marking
-                                self.consensus_count[name] = self.consensus_count.get(name, 0) + 1
-                                
-                                if self.consensus_count[name] >= 3:
-                                    if not hasattr(self, 'last_marked') or (datetime.now() - self.last_marked).seconds > 10:
-                                        self.last_marked = datetime.now()
-                                        rectype = self.mark_attendance(name)
-                                        send_whatsapp_alert(name, rectype)
-                                        self.consensus_count[name] = 0
-                                        # Rotate challenge for next person/scan
-                                        self.liveness.next_challenge()
-                            else:
-                                color = (255, 165, 0) # Orange (Pending)
-                                self.consensus_count[name] = 0
+                    if state in ("verified", "cooldown"):
+                        color = (0, 255, 0) # Green (Verified / already marked)
+                    elif state == "pending":
+                        color = (255, 165, 0) # Orange (Pending)
+                        status = f"{name} ({res['challenge'].upper()})"
                     
                     cv2.rectangle(frame, (left, top), (right, bottom), color, 2)
-                    status = f"{name} (VERIFYING...)" if name != "Unknown" and not challenge_ok else name
                     cv2.putText(frame, status, (left, top - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255), 2)
 
-                # Show Challenge Overlay
-                cv2.putText(frame, f"CHALLENGE: {self.liveness.challenge.upper()}", 
-                            (10, frame.shape[0] - 20), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 255), 2)
+                # Recent punches, newest at the bottom
+                now = time.time()
+                self.toasts = [(text, until) for text, until in self.toasts if until > now]
+                for i, (text, _) in enumerate(reversed(self.toasts)):
+                    cv2.putText(frame, text, (10, frame.shape[0] - 20 - 30 * i),
+                                cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 255), 2)
 
                 img = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
                 imgtk = ImageTk.PhotoImage(image=img)
@@ -304,15 +380,15 @@ class FaceAttendanceApp(ctk.CTk):
             messagebox.showwarning("Warning", "Please enter a name first.")
             return
 
-        cap = cv2.VideoCapture(0)
+        stream = CameraStream(0).start()
         count = 0
         captured_encodings = []
 
         messagebox.showinfo("Registration", "Webcam will open. Press 'C' once to start Burst Mode (Auto-capture 20 photos).")
 
         while count < 20:
-            ret, frame = cap.read()
-            if not ret: break
+            frame = stream.read_frame()
+            if frame is None: break
             
             cv2.putText(frame, f"Identity: {name} | Captured: {count}/20", (30, 30), 
                         cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 254), 2)
@@ -324,7 +400,8 @@ class FaceAttendanceApp(ctk.CTk):
             if key == ord('c') or count > 0:
                 rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
                 locs = face_recognition.face_locations(rgb)
-                encs = face_recognition.face_encodings(rgb, locs)
+                # Same 5-point alignment the scanners use for their descriptors
+                encs = encode_faces(rgb, locs)
                 
                 if len(encs) == 1:
                     captured_encodings.append(encs[0])
@@ -338,13 +415,12 @@ class FaceAttendanceApp(ctk.CTk):
             if key == ord('q'):
                 break
 
-        cap.release()
+        stream.release()
         cv2.destroyAllWindows()
 
         if count == 20:
-            self.data["encodings"].extend(captured_encodings)
-            self.data["names"].extend([name] * 20)
-            save_data(self.data)
+            save_data(captured_encodings, [name] * 20)
+            self.gallery.refresh(force=True)
             messagebox.showinfo("Success", f"Identity '{name}' successfully enrolled.")
             self.show_dashboard()
 
@@ -352,28 +428,21 @@ class FaceAttendanceApp(ctk.CTk):
         ctk.set_appearance_mode(new_appearance_mode)
 
     def stop_camera(self):
+        # The recognition worker releases the camera stream once it has wound down
         self.running_camera = False
-        if hasattr(self, 'cap') and self.cap:
-            self.cap.release()
+        self.recognition_active = False
         cv2.destroyAllWindows()
 
     def mark_attendance(self, name):
-        df = pd.read_csv(ATTENDANCE_FILE) if os.path.exists(ATTENDANCE_FILE) else pd.DataFrame(columns=["Name", "Date", "Time", "Type"])
         now = datetime.now()
-        date = now.strftime("%Y-%m-%d")
         time_str = now.strftime("%H:%M:%S")
-        
-        today_records = df[(df["Name"] == name) & (df["Date"] == date)]
-        record_type = "Punch-In" if len(today_records) == 0 or today_records.iloc[-1]["Type"] == "Punch-Out" else "Punch-Out"
-        
-        new_row = {"Name": name, "Date": date, "Time": time_str, "Type": record_type}
-        df = pd.concat([df, pd.DataFrame([new_row])], ignore_index=True)
-        df.to_csv(ATTENDANCE_FILE, index=False)
-        
+        record_type = get_punch_index(ATTENDANCE_FILE).punch(name, now)
+        if record_type is None:
+            print(f"[{time_str}] Duplicate punch ignored for {name}")
+            return None
+
+        # Runs on the recognition worker: no dialogs, the scanner keeps serving the queue
         print(f"[{time_str}] {record_type} recorded for {name}")
-        messagebox.showinfo("Attendance Marked", f"{record_type} recorded for {name} at {time_str}")
-        self.stop_camera()
-        self.btn_action.configure(text="Start Scanner", fg_color=["#3B8ED0", "#1F6AA5"]) # Reset button
         return record_type
 
 if __name__ == "__main__":
@@ -0,0 +1,129 @@
+"""
+Adaptive detection resolution and regions of interest.
+
+A fixed 0.25 downscale misses distant faces (too few pixels for the HOG
+window) and wastes work on close ones. AdaptiveScaler picks the working scale
+so faces land near TARGET_FACE_PX tall, capped by a per-frame detection
+budget (the engine measures detector cost per megapixel), though a full
+sweep never drops below SWEEP_MIN_SCALE. DetectionPlanner then restricts detection to padded
+regions around the faces already being tracked, with a full-frame sweep every
+FULL_SWEEP_EVERY submitted frames (and whenever nobody is tracked) so
+newcomers are still found.
+"""
+import math
+
+TARGET_FACE_PX = 64      # face height the detector works well at (dlib HOG finds ~40 px upsampled)
+MIN_SCALE = 0.15
+MAX_SCALE = 1.0
+SEARCH_SCALE = 0.5       # sweep scale while nobody is around, so distant newcomers are seen
+SWEEP_MIN_SCALE = 0.25   # sweeps never go coarser than the old fixed downscale, budget or not
+FORGET_AFTER = 10        # empty results before face sizes are forgotten
+BUDGET_MS = 80.0         # full-sweep detector time the scale is capped to, per worker
+FULL_SWEEP_EVERY = 10    # submitted frames between full sweeps while faces are tracked
+ROI_PAD = 0.4            # region padding around a track, as a fraction of its size
+MAX_ROI_COVERAGE = 0.5   # regions costing more than this fraction of a sweep: sweep instead
+
+
+class AdaptiveScaler:
+    def __init__(self, target_face=TARGET_FACE_PX, min_scale=MIN_SCALE, max_scale=MAX_SCALE,
+                 search_scale=SEARCH_SCALE, sweep_min_scale=SWEEP_MIN_SCALE, budget_ms=BUDGET_MS,
+                 smoothing=0.3, forget_after=FORGET_AFTER):
+        self.target_face = target_face
+        self.min_scale = min_scale
+        self.max_scale = max_scale
+        self.search_scale = search_scale
+        self.sweep_min_scale = sweep_min_scale
+        self.budget_ms = budget_ms
+        self.smoothing = smoothing
+        self.forget_after = forget_after
+        self.face_px = None   # smoothed height of the smallest face seen, in frame pixels
+        self.empty = 0        # consecutive results without a face
+
+    def _clip(self, scale):
+        return min(max(scale, self.min_scale), self.max_scale)
+
+    def observe(self, boxes):
+        """ Feed the (top, right, bottom, left) boxes of one result """
+        heights = [bottom - top for top, _, bottom, _ in boxes if bottom > top]
+        if not heights:
+            self.empty += 1
+            if self.empty >= self.forget_after:
+                self.face_px = None
+            return
+        self.empty = 0
+        smallest = min(heights)
+        if self.face_px is None:
+            self.face_px = float(smallest)
+        else:
+            self.face_px += self.smoothing * (smallest - self.face_px)
+
+    def scale_for(self, face_px):
+        """ Scale that brings a face of this height to the target size """
+        return self._clip(self.target_face / max(face_px, 1))
+
+    def budget_scale(self, shape, ms_per_mpix):
+        """ Largest scale whose full sweep of a frame this shape fits the budget """
+        if not ms_per_mpix:
+            return self.max_scale
+        height, width = shape[:2]
+        return math.sqrt(self.budget_ms * 1e6 / (ms_per_mpix * height * width))
+
+    def full_scale(self, shape, ms_per_mpix=None):
+        """
+        Working scale for a full-frame sweep: fine enough for the smallest recent
+        face, within the budget, and never coarser than sweep_min_scale.
+        """
+        scale = self.search_scale if self.face_px is None else self.scale_for(self.face_px)
+        scale = min(scale, self.budget_scale(shape, ms_per_mpix))
+        return self._clip(max(self.sweep_min_scale, scale))
+
+
+def pad_box(box, pad, shape):
+    """ (top, right, bottom, left) grown by pad x its size on every side, clipped to the frame """
+    top, right, bottom, left = box
+    dy, dx = int((bottom - top) * pad), int((right - left) * pad)
+    height, width = shape[:2]
+    return (max(top - dy, 0), min(right + dx, width), min(bottom + dy, height), max(left - dx, 0))
+
+
+class DetectionPlanner:
+    def __init__(self, scaler=None, pad=ROI_PAD, full_sweep_every=FULL_SWEEP_EVERY,
+                 max_coverage=MAX_ROI_COVERAGE):
+        self.scaler = scaler or AdaptiveScaler()
+        self.pad = pad
+        self.full_sweep_every = full_sweep_every
+        self.max_coverage = max_coverage
+        self.since_sweep = full_sweep_every   # the first frame is always a sweep
+        self.sweeps = 0
+        self.roi_frames = 0
+
+    def plan(self, boxes, shape, ms_per_mpix=None):
+        """
+        Where and how finely to search the next submitted frame.
+
+        boxes: the tracker's current boxes in frame pixels. Returns
+        (scale, regions) for RecognitionEngine.submit: either a full sweep
+        (regions None) or one padded region per box, each scaled for its face.
+        """
+        self.since_sweep += 1
+        full_scale = self.scaler.full_scale(shape, ms_per_mpix)
+        if boxes and self.since_sweep < self.full_sweep_every:
+            regions = [(pad_box(box, self.pad, shape), self.scaler.scale_for(box[2] - box[0]))
+                       for box in boxes]
+            # Compare pixels actually scanned: big regions around close faces are cheap when downscaled
+            work = sum((r[2] - r[0]) * (r[1] - r[3]) * s * s for r, s in regions)
+            if work <= self.max_coverage * shape[0] * shape[1] * full_scale * full_scale:
+                self.roi_frames += 1
+                return None, regions
+
+        self.since_sweep = 0
+        self.sweeps += 1
+        return full_scale, None
+
+    def observe(self, faces):
+        """ Feed one engine result so the next plans follow face sizes """
+        self.scaler.observe([face["loc"] for face in faces])
+
+    def stats(self):
+        return {"sweeps": self.sweeps, "roi_frames": self.roi_frames,
+                "face_px": None if self.scaler.face_px is None else round(self.scaler.face_px, 1)}
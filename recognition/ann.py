@@ -0,0 +1,180 @@
+import os
+import zlib
+import numpy as np
+
+from recognition.gallery import EMBEDDING_DIM, _top_k
+
+DEFAULT_NPROBE = 8
+KMEANS_ITERATIONS = 12
+TRAIN_POINTS_PER_LIST = 64
+MIN_INDEXED = 1000       # below this many samples an exact scan is as fast, and k-means has too little to learn from
+
+
+def index_path_for(encodings_file):
+    """ The IVF index lives next to the gallery: data/encodings.pkl -> data/encodings.ivf.npz """
+    return os.path.splitext(encodings_file)[0] + ".ivf.npz"
+
+
+def default_nlist(count):
+    """ ~4*sqrt(N) partitions keeps both the coarse and the fine scan small """
+    return int(np.clip(4 * np.sqrt(max(count, 1)), 1, 4096))
+
+
+def _gallery_checksum(matrix):
+    return zlib.crc32(np.ascontiguousarray(matrix).tobytes())
+
+
+def _assign(matrix, centroids, chunk=65536):
+    """ Nearest centroid per row, chunked so 200k x nlist never materialises at once """
+    c_norms = np.einsum("ij,ij->i", centroids, centroids)
+    out = np.empty(matrix.shape[0], dtype=np.int32)
+    for start in range(0, matrix.shape[0], chunk):
+        block = matrix[start:start + chunk]
+        d2 = c_norms[None, :] - 2.0 * (block @ centroids.T)
+        out[start:start + chunk] = np.argmin(d2, axis=1)
+    return out
+
+
+def kmeans(matrix, nlist, iterations=KMEANS_ITERATIONS, seed=0):
+    """ Plain Lloyd k-means on a subsample of the gallery """
+    rng = np.random.default_rng(seed)
+    count = matrix.shape[0]
+    nlist = min(nlist, count)
+
+    train_size = min(count, nlist * TRAIN_POINTS_PER_LIST)
+    train = matrix[rng.choice(count, train_size, replace=False)] if train_size < count else matrix
+    centroids = train[rng.choice(train.shape[0], nlist, replace=False)].astype(np.float32)
+
+    for _ in range(iterations):
+        assignment = _assign(train, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, train)
+        counts = np.bincount(assignment, minlength=nlist)
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, None]
+        # Re-seed empty partitions from random training points
+        if not filled.all():
+            centroids[~filled] = train[rng.choice(train.shape[0], int((~filled).sum()))]
+
+    return np.ascontiguousarray(centroids, dtype=np.float32)
+
+
+class IVFIndex:
+    """
+    Inverted-file index over a GalleryMatcher.
+
+    Encodings are partitioned by k-means; a query scans the `nprobe` closest
+    partitions only and the shortlist is re-ranked with exact distances, so
+    returned distances are always the true ones. Raising nprobe trades latency
+    for recall (nprobe == nlist is an exact scan).
+    """
+
+    def __init__(self, matcher, nlist=None, nprobe=DEFAULT_NPROBE):
+        self.matcher = matcher
+        self.nlist = nlist or default_nlist(len(matcher))
+        self.nprobe = nprobe
+        self.centroids = np.empty((0, EMBEDDING_DIM), dtype=np.float32)
+        self.assignment = np.empty(0, dtype=np.int32)
+        self.lists = []
+        self.saved_count = 0
+
+    def __len__(self):
+        return self.assignment.shape[0]
+
+    def train(self, seed=0):
+        matrix = self.matcher.matrix
+        if matrix.shape[0] == 0:
+            return self
+        self.centroids = kmeans(matrix, self.nlist, seed=seed)
+        self.nlist = self.centroids.shape[0]
+        self._set_assignment(_assign(matrix, self.centroids))
+        return self
+
+    def _set_assignment(self, assignment):
+        self.assignment = assignment
+        order = np.argsort(assignment, kind="stable")
+        bounds = np.searchsorted(assignment[order], np.arange(self.nlist + 1))
+        self.lists = [order[bounds[i]:bounds[i + 1]] for i in range(self.nlist)]
+
+    def add(self, start):
+        """ Assign gallery rows [start:] to their nearest partition without retraining """
+        if self.centroids.shape[0] == 0:
+            self.train()
+            return
+        new_rows = np.arange(start, len(self.matcher))
+        if new_rows.size == 0:
+            return
+        new_assignment = _assign(self.matcher.rows(start)[0], self.centroids)
+        self.assignment = np.concatenate([self.assignment, new_assignment])
+        for part in np.unique(new_assignment):
+            self.lists[part] = np.concatenate([self.lists[part], new_rows[new_assignment == part]])
+
+    def search(self, probes, k=1):
+        """ Same contract as GalleryMatcher.search: (M, k) rows and exact distances """
+        nprobe = min(self.nprobe, self.nlist)
+        c_norms = np.einsum("ij,ij->i", self.centroids, self.centroids)
+        coarse = c_norms[None, :] - 2.0 * (probes @ self.centroids.T)
+        probe_lists = np.argpartition(coarse, nprobe - 1, axis=1)[:, :nprobe]
+
+        all_idx = np.full((probes.shape[0], k), -1, dtype=np.int64)
+        all_dists = np.full((probes.shape[0], k), np.inf, dtype=np.float32)
+        for i, parts in enumerate(probe_lists):
+            rows = np.concatenate([self.lists[p] for p in parts])
+            if rows.size == 0:
+                continue
+            idx, dists = _top_k(self.matcher.distances(probes[i:i + 1], rows), k)
+            all_idx[i, :idx.shape[1]] = rows[idx[0]]
+            all_dists[i, :idx.shape[1]] = dists[0]
+        return all_idx, all_dists
+
+    # ---------------- persistence ----------------
+    def save(self, path):
+        # Every worker may save at once: a private temp file, so a rename never publishes a torn one
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f,
+                     centroids=self.centroids,
+                     assignment=self.assignment,
+                     nprobe=self.nprobe,
+                     checksum=_gallery_checksum(self.matcher.rows(0, len(self))[0]))
+        os.replace(tmp, path)
+        self.saved_count = len(self)
+
+    @classmethod
+    def load(cls, matcher, path, nprobe=None):
+        """
+        Reuse a persisted index if it still describes (a prefix of) the gallery;
+        rows enrolled since it was saved are assigned incrementally.
+        Returns None when the file is missing or stale.
+        """
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path) as saved:
+                centroids = saved["centroids"]
+                assignment = saved["assignment"]
+                saved_nprobe = int(saved["nprobe"])
+                checksum = int(saved["checksum"])
+        except (OSError, KeyError, ValueError):
+            return None
+
+        count = assignment.shape[0]
+        if count > len(matcher) or _gallery_checksum(matcher.rows(0, count)[0]) != checksum:
+            return None
+
+        index = cls(matcher, nlist=centroids.shape[0], nprobe=nprobe or saved_nprobe)
+        index.centroids = centroids
+        index._set_assignment(assignment)
+        index.saved_count = count
+        index.add(count)
+        return index
+
+
+def load_or_build(matcher, path, nprobe=DEFAULT_NPROBE, nlist=None):
+    """ Open the persisted index for `matcher`, training and saving a new one if needed """
+    index = IVFIndex.load(matcher, path, nprobe=nprobe)
+    if index is None:
+        index = IVFIndex(matcher, nlist=nlist, nprobe=nprobe).train()
+    if len(index) > index.saved_count:
+        index.save(path)
+    return index
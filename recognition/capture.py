@@ -0,0 +1,150 @@
+"""
+Camera capture on its own thread with a latest-frame buffer.
+
+CameraStream reads the device continuously into a shared-memory FrameRing,
+so driver latency never blocks the UI/recognition loop and stale frames do
+not pile up in the driver's buffer. Only the newest frame is kept: a frame
+that is superseded before anyone reads it is counted as dropped, and so is a
+frame that arrives while every ring slot is leased (readers behind): a full
+ring is back-pressure, not a camera failure.
+
+read() hands out the newest unseen frame as a FrameRef leased to the caller
+(release it, or pass the lease on to the recognition engine); read_frame()
+returns a private copy for callers that keep frames around.
+"""
+import time
+import threading
+import cv2
+import numpy as np
+
+from recognition.frame_ring import DEFAULT_SLOTS, FrameRing, camera_shape
+
+MAX_READ_FAILURES = 50   # consecutive failed reads before the camera counts as gone
+
+
+class CameraStream:
+    def __init__(self, src=0, slots=DEFAULT_SLOTS, width=None, height=None):
+        self.cap = cv2.VideoCapture(src)
+        if width and height:
+            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+        # Ask the driver not to queue frames behind our back (ignored by some backends)
+        self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        self.ring = FrameRing(camera_shape(self.cap), slots=slots) if self.cap.isOpened() else None
+
+        self.frames = 0
+        self.dropped = 0
+        self.ring_full = 0   # frames dropped because every slot was leased
+        self.fps = 0.0
+        self.ended = False
+
+        self._cond = threading.Condition()
+        self._latest = None
+        self._fresh = False
+        self._stop = threading.Event()
+        self._thread = None
+
+    def isOpened(self):
+        return self.ring is not None
+
+    @property
+    def shape(self):
+        return self.ring.shape
+
+    def start(self):
+        if self.isOpened() and self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="camera-capture", daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        failures = 0
+        window_start, window_frames = time.monotonic(), 0
+        while not self._stop.is_set():
+            if not self.ring.has_free_slot():
+                # Consumers hold every slot: pull the frame off the driver and drop it,
+                # so the next one we keep is fresh. Only the camera itself can fail here.
+                ok = self.cap.grab()
+                if ok:
+                    failures = 0
+                    with self._cond:
+                        self.dropped += 1
+                        self.ring_full += 1
+                else:
+                    failures += 1
+                    if failures >= MAX_READ_FAILURES:
+                        break
+                    time.sleep(0.01)
+                continue
+
+            # We are the only writer, so a free slot is still free here
+            ref = self.ring.read_from(self.cap)
+            if ref is None:
+                failures += 1
+                if failures >= MAX_READ_FAILURES:
+                    break
+                time.sleep(0.01)    # camera hiccup
+                continue
+            failures = 0
+
+            with self._cond:
+                if self._fresh:
+                    self.dropped += 1
+                self._latest = ref
+                self._fresh = True
+                self.frames += 1
+                self._cond.notify_all()
+
+            window_frames += 1
+            elapsed = time.monotonic() - window_start
+            if elapsed >= 1.0:
+                self.fps = window_frames / elapsed
+                window_start, window_frames = time.monotonic(), 0
+
+        with self._cond:
+            self.ended = True
+            self._cond.notify_all()
+
+    def read(self, timeout=1.0):
+        """ Newest frame not handed out before, leased to the caller; None on timeout/end """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._fresh or self.ended, timeout) or not self._fresh:
+                return None
+            ref = self._latest
+            self._fresh = False
+            self.ring.lease(ref)
+        if not self.ring.valid(ref):
+            # Lapped by the capture thread between publish and lease
+            self.ring.release(ref)
+            return None
+        return ref
+
+    def view(self, ref):
+        return self.ring.view(ref)
+
+    def release_frame(self, ref):
+        self.ring.release(ref)
+
+    def read_frame(self, timeout=1.0):
+        """ Newest frame as a private array (or None) """
+        ref = self.read(timeout)
+        if ref is None:
+            return None
+        try:
+            return np.array(self.ring.view(ref))
+        finally:
+            self.ring.release(ref)
+
+    def stats(self):
+        return {"fps": round(self.fps, 1), "frames": self.frames, "dropped": self.dropped,
+                "ring_full": self.ring_full}
+
+    def release(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+        self.cap.release()
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
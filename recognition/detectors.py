@@ -0,0 +1,160 @@
+"""
+Pluggable face detectors.
+
+Every detector takes the RGB working image and returns face_recognition-style
+(top, right, bottom, left) boxes, so the rest of the pipeline does not care
+which backend found the faces:
+
+    hog    dlib HOG via face_recognition (the original detector)
+    haar   OpenCV Haar cascade: fastest, least accurate
+    yunet  OpenCV FaceDetectorYN (DNN, CPU); needs the .onnx model
+    ssd    OpenCV res10 SSD (DNN, CPU); needs the .prototxt + .caffemodel
+
+"proposer+confirmer" (e.g. "haar+hog") builds a cascade: the cheap detector
+proposes regions and the expensive one only searches padded crops around
+them, which is much less area than the whole frame.
+"""
+import os
+import cv2
+import numpy as np
+
+MODELS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "models")
+YUNET_MODEL = os.path.join(MODELS_DIR, "face_detection_yunet_2023mar.onnx")
+SSD_PROTOTXT = os.path.join(MODELS_DIR, "deploy.prototxt")
+SSD_WEIGHTS = os.path.join(MODELS_DIR, "res10_300x300_ssd_iter_140000.caffemodel")
+
+
+def _xywh_to_css(x, y, w, h, shape):
+    height, width = shape[:2]
+    return (max(int(y), 0), min(int(x + w), width), min(int(y + h), height), max(int(x), 0))
+
+
+def _require(path):
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Detector model not found: {path}")
+    return path
+
+
+class HOGDetector:
+    def __init__(self, upsample=1):
+        import face_recognition
+        self._locate = face_recognition.face_locations
+        self.upsample = upsample
+
+    def detect(self, rgb):
+        return self._locate(rgb, number_of_times_to_upsample=self.upsample, model="hog")
+
+
+class HaarDetector:
+    def __init__(self, cascade=None, scale_factor=1.1, min_neighbors=5, min_size=20):
+        if not hasattr(cv2, "CascadeClassifier"):
+            raise RuntimeError("This OpenCV build has no Haar cascades (removed in OpenCV 5); use opencv-python<5")
+        path = cascade or os.path.join(cv2.data.haarcascades, "haarcascade_frontalface_default.xml")
+        self.cascade = cv2.CascadeClassifier(_require(path))
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.min_size = min_size
+
+    def detect(self, rgb):
+        gray = cv2.cvtColor(rgb, cv2.COLOR_RGB2GRAY)
+        boxes = self.cascade.detectMultiScale(gray, scaleFactor=self.scale_factor,
+                                              minNeighbors=self.min_neighbors,
+                                              minSize=(self.min_size, self.min_size))
+        return [_xywh_to_css(x, y, w, h, rgb.shape) for x, y, w, h in boxes]
+
+
+class YuNetDetector:
+    def __init__(self, model=YUNET_MODEL, score_threshold=0.7, nms_threshold=0.3):
+        self.net = cv2.FaceDetectorYN.create(_require(model), "", (320, 320), score_threshold, nms_threshold)
+        self._size = None
+
+    def detect(self, rgb):
+        height, width = rgb.shape[:2]
+        if self._size != (width, height):
+            self.net.setInputSize((width, height))
+            self._size = (width, height)
+        _, faces = self.net.detect(cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR))
+        if faces is None:
+            return []
+        return [_xywh_to_css(*face[:4], rgb.shape) for face in faces]
+
+
+class SSDDetector:
+    def __init__(self, prototxt=SSD_PROTOTXT, weights=SSD_WEIGHTS, confidence=0.5):
+        if not hasattr(cv2.dnn, "readNetFromCaffe"):
+            raise RuntimeError("This OpenCV build cannot read Caffe models (removed in OpenCV 5); use opencv-python<5")
+        self.net = cv2.dnn.readNetFromCaffe(_require(prototxt), _require(weights))
+        self.confidence = confidence
+
+    def detect(self, rgb):
+        height, width = rgb.shape[:2]
+        # The model was trained on BGR with means (104, 177, 123); swapRB turns our
+        # RGB into BGR and the mean is subtracted in that (output) channel order
+        blob = cv2.dnn.blobFromImage(rgb, 1.0, (300, 300), (104.0, 177.0, 123.0), swapRB=True)
+        self.net.setInput(blob)
+        detections = self.net.forward()[0, 0]
+        boxes = []
+        for det in detections[detections[:, 2] >= self.confidence]:
+            left, top, right, bottom = det[3:7] * np.array([width, height, width, height])
+            boxes.append(_xywh_to_css(left, top, right - left, bottom - top, rgb.shape))
+        return [b for b in boxes if b[2] > b[0] and b[1] > b[3]]
+
+
+class CascadeDetector:
+    """ Cheap proposer over the whole frame, expensive confirmer only around its proposals """
+
+    def __init__(self, proposer, confirmer, pad=0.5):
+        self.proposer = proposer
+        self.confirmer = confirmer
+        self.pad = pad
+
+    def detect(self, rgb):
+        height, width = rgb.shape[:2]
+        found = []
+        for top, right, bottom, left in self.proposer.detect(rgb):
+            dy, dx = int((bottom - top) * self.pad), int((right - left) * self.pad)
+            y0, y1 = max(top - dy, 0), min(bottom + dy, height)
+            x0, x1 = max(left - dx, 0), min(right + dx, width)
+            crop = np.ascontiguousarray(rgb[y0:y1, x0:x1])
+            for t, r, b, l in self.confirmer.detect(crop):
+                box = (t + y0, r + x0, b + y0, l + x0)
+                if not any(_overlaps(box, other) for other in found):
+                    found.append(box)
+        return found
+
+
+def _overlaps(a, b, threshold=0.5):
+    top, bottom = max(a[0], b[0]), min(a[2], b[2])
+    left, right = max(a[3], b[3]), min(a[1], b[1])
+    inter = max(bottom - top, 0) * max(right - left, 0)
+    smaller = min((a[2] - a[0]) * (a[1] - a[3]), (b[2] - b[0]) * (b[1] - b[3]))
+    return smaller > 0 and inter / smaller >= threshold
+
+
+BACKENDS = {
+    "hog": HOGDetector,
+    "haar": HaarDetector,
+    "yunet": YuNetDetector,
+    "ssd": SSDDetector,
+}
+
+
+def make_detector(spec="hog", **options):
+    """
+    Build a detector from a name such as "hog", "yunet" or "haar+hog".
+
+    options are passed to the backend whose name prefixes them, e.g.
+    make_detector("yunet", yunet_model="models/yunet.onnx", yunet_score_threshold=0.8).
+    """
+    names = spec.split("+")
+    if len(names) > 2 or any(name not in BACKENDS for name in names):
+        raise ValueError(f"Unknown detector '{spec}' (choose from {', '.join(BACKENDS)}, or proposer+confirmer)")
+
+    def build(name):
+        prefix = name + "_"
+        kwargs = {k[len(prefix):]: v for k, v in options.items() if k.startswith(prefix)}
+        return BACKENDS[name](**kwargs)
+
+    if len(names) == 1:
+        return build(names[0])
+    return CascadeDetector(build(names[0]), build(names[1]), pad=options.get("cascade_pad", 0.5))
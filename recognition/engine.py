@@ -0,0 +1,304 @@
+"""
+Multi-process recognition engine.
+
+Detection, 128-d encoding, landmarks and matching are CPU-bound dlib/numpy
+work that serialises on one core when run from a thread. RecognitionEngine
+fans frames out to a process pool (each worker owns its own hot-reloading
+GalleryService over the shared memory-mapped gallery) and hands results
+back strictly in submission order, tagged with their frame id.
+
+Back-pressure: at most max_pending frames are pending -- running, queued, or
+finished but not yet collected by poll()/drain(), since a finished frame
+still holds its ring lease until the consumer takes it. submit(block=False)
+drops the frame and returns None when that many are pending, which is what a
+live camera wants; block=True instead waits for the oldest frame's result.
+Tracking and liveness stay with the consumer.
+
+Frames can be passed as arrays (pickled to the worker) or, preferably, as
+FrameRefs into a shared-memory FrameRing, which workers read in place. A
+frame whose ring slot was overwritten before its worker finished yields
+faces=None.
+
+The detector is built once in the calling process as well, so a bad spec or
+a missing model file raises from the constructor instead of breaking the
+pool. If a worker dies anyway, its frames come back as faces=None and the
+pool is rebuilt; after MAX_POOL_RESTARTS crashes in a row without a good
+result, RuntimeError is raised.
+
+workers=0 runs everything inline in the calling process with the same API.
+"""
+import os
+import time
+import itertools
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+import cv2
+import numpy as np
+import face_recognition
+
+from recognition.service import get_gallery_service
+from recognition.frame_ring import FrameRef, FrameRing
+from recognition.tracker import iou_matrix
+from recognition.detectors import make_detector
+from recognition.landmarks import encode_faces, landmark_dict, predict_shapes, shape_points
+
+DEFAULT_THRESHOLD = 0.5
+DEFAULT_SCALE = 0.25
+MAX_POOL_RESTARTS = 3   # consecutive worker-pool crashes before giving up
+
+_worker = None   # per-process state set by _init_worker
+_rings = {}      # shared-memory rings attached by this worker, by name
+
+
+def default_workers():
+    """ Leave one core for capture, display and the consumer thread """
+    return max(1, (os.cpu_count() or 2) - 1)
+
+
+def _views(frame, scale, regions):
+    """ (y0, x0, scale, image) pieces to search: the whole frame, or padded regions """
+    if regions is None:
+        return [(0, 0, scale, frame)]
+    height, width = frame.shape[:2]
+    views = []
+    for (top, right, bottom, left), region_scale in regions:
+        top, left = max(int(top), 0), max(int(left), 0)
+        bottom, right = min(int(bottom), height), min(int(right), width)
+        if bottom - top >= 16 and right - left >= 16:
+            views.append((top, left, region_scale, frame[top:bottom, left:right]))
+    return views
+
+
+def analyse_frame(frame, matcher, threshold=DEFAULT_THRESHOLD, scale=DEFAULT_SCALE,
+                  skip_boxes=(), skip_iou=0.5, detector=None, landmarks=True, regions=None, timings=None):
+    """
+    Full per-frame pipeline on a BGR frame.
+
+    Searches the whole frame at `scale`, or only `regions` ([(box, scale)],
+    e.g. padded areas around known tracks) each at its own scale. Returns one
+    dict per face: "loc" (top, right, bottom, left) in full-frame pixels,
+    "name"/"distance" (None when the face overlaps one of skip_boxes, i.e. a
+    track the consumer already trusts), and the 68 landmarks in full-frame
+    pixels as "points" (68x2 array) and "landmarks" (dict).
+
+    Descriptors use the same 5-point alignment as enrollment; the 68-point
+    shape is predicted once, on the working-resolution image, for the
+    landmarks only. detector is any recognition.detectors backend (dlib HOG
+    when None). A timings dict, if given, accumulates "detect_ms" and
+    "detect_mpix": detector time and pixels scanned, without the per-face work.
+    """
+    faces = []
+    for y0, x0, view_scale, image in _views(frame, scale, regions):
+        small = cv2.resize(image, (0, 0), fx=view_scale, fy=view_scale)
+        rgb_small = cv2.cvtColor(small, cv2.COLOR_BGR2RGB)
+        started = time.perf_counter()
+        if detector is None:
+            locs = face_recognition.face_locations(rgb_small, model="hog")
+        else:
+            locs = detector.detect(rgb_small)
+        if timings is not None:
+            timings["detect_ms"] = timings.get("detect_ms", 0.0) + (time.perf_counter() - started) * 1000
+            timings["detect_mpix"] = timings.get("detect_mpix", 0.0) + rgb_small.shape[0] * rgb_small.shape[1] / 1e6
+
+        up = 1.0 / view_scale
+        found = []
+        for loc in locs:
+            full = (int(loc[0] * up) + y0, int(loc[1] * up) + x0, int(loc[2] * up) + y0, int(loc[3] * up) + x0)
+            # Overlapping regions can see the same face twice
+            if not faces or iou_matrix([full], [f["loc"] for f in faces]).max() < 0.5:
+                found.append((loc, full))
+        if not found:
+            continue
+
+        encode = list(range(len(found)))
+        if skip_boxes:
+            overlap = iou_matrix([full for _, full in found], skip_boxes).max(axis=1)
+            encode = [i for i in encode if overlap[i] < skip_iou]
+
+        batch = [{"loc": full, "name": None, "distance": None, "points": None, "landmarks": None}
+                 for _, full in found]
+        if encode:
+            encs = encode_faces(rgb_small, [found[i][0] for i in encode])
+            for i, (name, distance) in zip(encode, matcher.identify(encs, threshold)):
+                batch[i]["name"] = name
+                batch[i]["distance"] = distance
+
+        if landmarks:
+            offset = np.array([x0, y0], dtype=np.float32)
+            for i, shape in enumerate(predict_shapes(rgb_small, [loc for loc, _ in found])):
+                points = shape_points(shape, up) + offset
+                batch[i]["points"] = points
+                batch[i]["landmarks"] = landmark_dict(points)
+        faces.extend(batch)
+    return faces
+
+
+def track_faces(tracker, faces, gray=None):
+    """ Feed one engine result into the consumer's tracker; returns one Track per face """
+    tracks = tracker.update([face["loc"] for face in faces], gray=gray)
+    for track, face in zip(tracks, faces):
+        if face["name"] is not None:
+            tracker.assign(track, face["name"], face["distance"])
+    return tracks
+
+
+def _init_worker(gallery_file, legacy_path, gallery_options, settings):
+    global _worker
+    cv2.setNumThreads(1)   # one process per core; don't let OpenCV oversubscribe
+    _worker = dict(settings)
+    spec, options = settings["detector"]
+    _worker["detector"] = make_detector(spec, **options)
+    _worker["gallery"] = get_gallery_service(gallery_file, legacy_path, **gallery_options)
+
+
+def _run(frame, skip_boxes, overrides=None):
+    """
+    Analyse one frame in this worker; returns (faces, detector milliseconds,
+    megapixels scanned). Only detection scales with pixels, so only it is timed.
+    """
+    settings = dict(_worker)
+    gallery = settings.pop("gallery")
+    settings.update(overrides or {})
+    timings = {}
+    if not isinstance(frame, FrameRef):
+        faces = analyse_frame(frame, gallery.matcher(), skip_boxes=skip_boxes, timings=timings, **settings)
+        return faces, timings.get("detect_ms", 0.0), timings.get("detect_mpix", 0.0)
+
+    ref = frame
+    ring = _rings.get(ref.name)
+    if ring is None:
+        ring = _rings[ref.name] = FrameRing.attach(ref)
+    view = ring.view(ref)
+    if view is None:
+        return None, 0.0, 0.0
+    faces = analyse_frame(view, gallery.matcher(), skip_boxes=skip_boxes, timings=timings, **settings)
+    # Overwritten while we were reading it: the result may mix two frames
+    return (faces if ring.valid(ref) else None), timings.get("detect_ms", 0.0), timings.get("detect_mpix", 0.0)
+
+
+class RecognitionEngine:
+    def __init__(self, gallery_file, legacy_path=None, workers=None, max_pending=None,
+                 threshold=DEFAULT_THRESHOLD, scale=DEFAULT_SCALE, detector="hog", detector_options=None,
+                 landmarks=True, **gallery_options):
+        self.workers = default_workers() if workers is None else workers
+        self.max_pending = max_pending or max(2, 2 * self.workers)
+        self.dropped = 0
+        self.restarts = 0         # pool rebuilds since the last good result
+        self.ms_per_mpix = None   # smoothed detector cost per scanned megapixel, for adaptive scaling
+        self._ids = itertools.count()
+        self._pending = deque()   # (frame_id, future, pool generation), submission order
+        self._pool = None
+        self._generation = 0
+
+        # The detector is built inside each worker: OpenCV/dlib objects don't pickle
+        settings = {"threshold": threshold, "scale": scale, "landmarks": landmarks,
+                    "detector": (detector, detector_options or {})}
+        self._initargs = (gallery_file, legacy_path, gallery_options, settings)
+        if self.workers == 0:
+            _init_worker(*self._initargs)
+        else:
+            # A bad spec or a missing model file fails here, with its own error, rather
+            # than in every worker's initializer where it only breaks the pool
+            make_detector(detector, **(detector_options or {}))
+            self._start_pool()
+
+    def _start_pool(self):
+        self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                         initializer=_init_worker, initargs=self._initargs)
+        self._generation += 1
+
+    def _restart(self, generation, error):
+        """ Replace a crashed pool; only the first lost frame of that pool does it """
+        if generation != self._generation:
+            return
+        self.restarts += 1
+        if self.restarts > MAX_POOL_RESTARTS:
+            raise RuntimeError(f"Recognition workers keep crashing ({MAX_POOL_RESTARTS} restarts "
+                               f"without a result): {error}") from error
+        print(f"[WARN] Recognition worker pool crashed ({error}); restarting it")
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        self._start_pool()
+
+    def in_flight(self):
+        """ Frames submitted and not yet collected, finished or not """
+        return len(self._pending)
+
+    def submit(self, frame, skip_boxes=(), block=True, frame_id=None, scale=None, regions=None):
+        """
+        Queue a frame (array or FrameRef); returns its frame id, or None if dropped.
+
+        scale overrides the engine's working scale for this frame; regions
+        ([(box, scale)] in frame pixels) restricts detection to those areas.
+        """
+        if self.in_flight() >= self.max_pending:
+            if not block:
+                self.dropped += 1
+                return None
+            # Results come out in order, so the oldest frame is the next to free a slot;
+            # the caller collects it with its next poll()
+            wait([self._pending[0][1]])
+
+        frame_id = next(self._ids) if frame_id is None else frame_id
+        skip_boxes = [tuple(box) for box in skip_boxes]
+        overrides = {}
+        if scale is not None:
+            overrides["scale"] = scale
+        if regions is not None:
+            overrides["regions"] = [(tuple(box), s) for box, s in regions]
+        if self._pool is None:
+            future = Future()
+            try:
+                future.set_result(_run(frame, skip_boxes, overrides))
+            except Exception as e:
+                future.set_exception(e)
+        else:
+            try:
+                future = self._pool.submit(_run, frame, skip_boxes, overrides)
+            except BrokenProcessPool as e:
+                self._restart(self._generation, e)
+                future = self._pool.submit(_run, frame, skip_boxes, overrides)
+        self._pending.append((frame_id, future, self._generation))
+        return frame_id
+
+    def _pop(self):
+        frame_id, future, generation = self._pending.popleft()
+        try:
+            faces, elapsed, mpix = future.result()
+        except BrokenProcessPool as e:
+            # Lost with its worker: like an overwritten frame, the caller just releases it
+            self._restart(generation, e)
+            return frame_id, None
+        except Exception as e:
+            print(f"[WARN] Recognition failed for frame {frame_id}: {e}")
+            return frame_id, []
+        self.restarts = 0
+        if faces is not None and mpix > 0:
+            cost = elapsed / mpix
+            self.ms_per_mpix = cost if self.ms_per_mpix is None else 0.8 * self.ms_per_mpix + 0.2 * cost
+        return frame_id, faces
+
+    def poll(self):
+        """ Completed results in submission order, without blocking """
+        ready = []
+        while self._pending and self._pending[0][1].done():
+            ready.append(self._pop())
+        return ready
+
+    def drain(self):
+        """ Wait for every in-flight frame and return all results in order """
+        ready = []
+        while self._pending:
+            ready.append(self._pop())
+        return ready
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+        elif self.workers == 0:
+            for ring in _rings.values():
+                ring.close()
+            _rings.clear()
+        self._pending.clear()
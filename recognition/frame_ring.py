@@ -0,0 +1,143 @@
+"""
+Fixed-size ring of camera frames in multiprocessing.shared_memory.
+
+The capturing process owns the ring and writes each frame straight into a
+preallocated slot (cap.read(slot_view)); recognition workers attach by name
+and get numpy views of the same pages, so a frame is never copied, pickled
+or allocated on its way to a worker. Only a small FrameRef (ring name, slot,
+sequence number) crosses the process boundary.
+
+Every slot carries a sequence number: odd while the capturer is writing it,
+even once published. A reader checks the number before and after using a
+slot; if it moved, the slot was overwritten and the result is discarded.
+Slots handed to a worker are leased so the capturer skips them until the
+result comes back.
+"""
+import sys
+import threading
+from collections import namedtuple
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+DEFAULT_SLOTS = 8
+_ALIGN = 64
+
+FrameRef = namedtuple("FrameRef", "name shape slots slot seq")
+
+
+def _layout(shape, slots):
+    header = -(-8 * slots // _ALIGN) * _ALIGN
+    frame_bytes = int(np.prod(shape))
+    return header, header + frame_bytes * slots
+
+
+def camera_shape(cap, default=(480, 640)):
+    """ (height, width, 3) the capture device reports, for sizing a ring """
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)) or default[1]
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)) or default[0]
+    return (height, width, 3)
+
+
+def _open_shm(name):
+    """ Attach without taking ownership; the creating process unlinks """
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    # Older Pythons always register; workers share the owner's resource
+    # tracker, so the registration is simply dropped again by the owner's unlink
+    return shared_memory.SharedMemory(name=name)
+
+
+class FrameRing:
+    def __init__(self, shape, slots=DEFAULT_SLOTS, name=None):
+        """ Create a ring (name=None) or attach to an existing one by name """
+        self.shape = tuple(shape)
+        self.slots = slots
+        self.owner = name is None
+        header, size = _layout(self.shape, slots)
+        self._shm = shared_memory.SharedMemory(create=True, size=size) if self.owner else _open_shm(name)
+        self.name = self._shm.name
+        self.seq = np.ndarray((slots,), dtype=np.uint64, buffer=self._shm.buf)
+        self.frames = np.ndarray((slots,) + self.shape, dtype=np.uint8, buffer=self._shm.buf, offset=header)
+        if self.owner:
+            self.seq[:] = 0
+
+        self._lock = threading.Lock()
+        self._leased = set()
+        self._cursor = 0
+
+    @classmethod
+    def attach(cls, ref):
+        return cls(ref.shape, ref.slots, name=ref.name)
+
+    # ---------- writer side (single capture thread) ----------
+    def acquire(self):
+        """ Next slot that is not leased, marked as being written; None if all are leased """
+        with self._lock:
+            for step in range(self.slots):
+                slot = (self._cursor + step) % self.slots
+                if slot not in self._leased:
+                    self._cursor = (slot + 1) % self.slots
+                    self.seq[slot] += 1          # odd: write in progress
+                    return slot
+        return None
+
+    def has_free_slot(self):
+        """ False when every slot is leased (readers are behind; the writer must drop) """
+        with self._lock:
+            return len(self._leased) < self.slots
+
+    def commit(self, slot):
+        """ Publish a written slot; returns the FrameRef readers use to find it """
+        self.seq[slot] += 1                      # even: published
+        return FrameRef(self.name, self.shape, self.slots, slot, int(self.seq[slot]))
+
+    def read_from(self, cap):
+        """ cap.read() directly into the next free slot: FrameRef, or None on failure/full ring """
+        slot = self.acquire()
+        if slot is None:
+            return None
+        view = self.frames[slot]
+        ret, frame = cap.read(view)
+        if ret and frame is not None and frame.ctypes.data != view.ctypes.data:
+            # Driver handed back its own buffer (size/format mismatch)
+            if frame.shape == view.shape:
+                np.copyto(view, frame)
+            else:
+                cv2.resize(frame, (self.shape[1], self.shape[0]), dst=view)
+        ref = self.commit(slot)
+        return ref if ret else None
+
+    def write(self, frame):
+        """ Copy a frame produced elsewhere into the ring """
+        slot = self.acquire()
+        if slot is None:
+            return None
+        np.copyto(self.frames[slot], frame)
+        return self.commit(slot)
+
+    def lease(self, ref):
+        with self._lock:
+            self._leased.add(ref.slot)
+
+    def release(self, ref):
+        with self._lock:
+            self._leased.discard(ref.slot)
+
+    # ---------- reader side ----------
+    def valid(self, ref):
+        return int(self.seq[ref.slot]) == ref.seq
+
+    def view(self, ref):
+        """ Zero-copy view of the frame, or None if the slot has moved on """
+        return self.frames[ref.slot] if self.valid(ref) else None
+
+    def close(self):
+        self.seq = self.frames = None
+        try:
+            self._shm.close()
+        except BufferError:
+            pass    # a caller still holds a view; the mapping goes with it
+        if self.owner:
+            self._shm.unlink()
@@ -0,0 +1,212 @@
+import threading
+import numpy as np
+
+EMBEDDING_DIM = 128
+
+
+def _empty_part():
+    return (np.empty((0, EMBEDDING_DIM), dtype=np.float32),
+            np.empty(0, dtype=np.float32),
+            np.empty(0, dtype=np.int32))
+
+
+def _euclidean(probes, probe_norms, matrix, sq_norms):
+    """ ||p - g|| for every probe/row pair: one GEMM plus in-place updates """
+    d2 = probes @ matrix.T
+    d2 *= -2.0
+    d2 += sq_norms[None, :]
+    d2 += probe_norms
+    np.maximum(d2, 0.0, out=d2)
+    return np.sqrt(d2, out=d2)
+
+
+class GalleryMatcher:
+    """
+    Enrolled face encodings held as contiguous float32 matrices.
+    Every probe in a frame is matched with a single matrix product instead of
+    one face_recognition.face_distance() call (and list -> array rebuild) per face.
+
+    Rows live in two parts: the base (an opened store's memory-mapped arrays,
+    used as-is so every process shares its pages) and a small in-RAM tail of
+    samples enrolled since. extend() only ever grows the tail, so an enrollment
+    never copies the base into private memory.
+    """
+
+    def __init__(self, encodings=None, names=None):
+        self.identities = []          # label -> name
+        self._label_of = {}           # name -> label
+        self._base = _empty_part()    # (matrix, sq_norms, labels), never modified
+        self._tail = _empty_part()    # rows appended by extend()
+        self.index = None             # optional ANN index (recognition.ann)
+        self._lock = threading.Lock()
+
+        if encodings is not None and len(encodings):
+            self.extend(encodings, names)
+
+    @classmethod
+    def from_data(cls, data):
+        """ Build from the {"encodings": [...], "names": [...]} gallery dict """
+        return cls(data.get("encodings", []), data.get("names", []))
+
+    @classmethod
+    def from_store(cls, store):
+        """ Wrap an opened recognition.store gallery; its memory-mapped arrays are used as-is """
+        matcher = cls()
+        matcher.identities = list(store.identities)
+        matcher._label_of = {name: label for label, name in enumerate(matcher.identities)}
+        matcher._base = (store.matrix, store.sq_norms, store.labels)
+        return matcher
+
+    def _parts(self):
+        with self._lock:
+            return self._base, self._tail
+
+    def __len__(self):
+        base, tail = self._parts()
+        return base[0].shape[0] + tail[0].shape[0]
+
+    def rows(self, start=0, stop=None):
+        """
+        (matrix, sq_norms, labels) for rows [start:stop]. A range inside the
+        base or the tail is a view; only one spanning both is copied.
+        """
+        base, tail = self._parts()
+        split = base[0].shape[0]
+        stop = split + tail[0].shape[0] if stop is None else stop
+        if stop <= split:
+            return tuple(a[start:stop] for a in base)
+        if start >= split:
+            return tuple(a[start - split:stop - split] for a in tail)
+        return tuple(np.concatenate([b[start:], t[:stop - split]]) for b, t in zip(base, tail))
+
+    @property
+    def matrix(self):
+        """ Every row as one array: the mapped base itself, or a copy while a tail is pending """
+        return self.rows()[0]
+
+    @property
+    def sq_norms(self):
+        return self.rows()[1]
+
+    @property
+    def labels(self):
+        return self.rows()[2]
+
+    @property
+    def identity_count(self):
+        return len(self.identities)
+
+    def name_of(self, row):
+        base, tail = self._parts()
+        split = base[0].shape[0]
+        return self.identities[base[2][row] if row < split else tail[2][row - split]]
+
+    def use_index(self, index):
+        """ Route search() through an index exposing search(probes, k) and add(start) """
+        self.index = index
+        return self
+
+    def _label(self, name):
+        label = self._label_of.get(name)
+        if label is None:
+            label = len(self.identities)
+            self._label_of[name] = label
+            self.identities.append(name)
+        return label
+
+    def extend(self, encodings, names):
+        """ Append new samples to the tail; norms are computed once here, never per match """
+        block = np.ascontiguousarray(np.asarray(encodings, dtype=np.float32).reshape(-1, EMBEDDING_DIM))
+        if len(names) != block.shape[0]:
+            raise ValueError("encodings and names must have the same length")
+
+        labels = np.fromiter((self._label(n) for n in names), dtype=np.int32, count=len(names))
+        norms = np.einsum("ij,ij->i", block, block)
+
+        with self._lock:
+            start = self._base[0].shape[0] + self._tail[0].shape[0]
+            matrix, sq_norms, tail_labels = self._tail
+            self._tail = (np.concatenate([matrix, block]),
+                          np.concatenate([sq_norms, norms]),
+                          np.concatenate([tail_labels, labels]))
+
+        if self.index is not None:
+            self.index.add(start)
+
+    def extend_stores(self, stores):
+        """ Append several opened stores (e.g. journal segments) in one step """
+        stores = [store for store in stores if len(store)]
+        if stores:
+            self.extend(np.concatenate([store.matrix for store in stores]),
+                        [name for store in stores for name in store.names])
+
+    def _as_probes(self, probes):
+        return np.ascontiguousarray(np.asarray(probes, dtype=np.float32).reshape(-1, EMBEDDING_DIM))
+
+    def distances(self, probes, rows=None):
+        """
+        Euclidean distances (M probes x N gallery rows) via
+        ||p - g||^2 = ||p||^2 + ||g||^2 - 2 p.g, i.e. one GEMM per part
+        (base and tail) for the whole frame.
+        """
+        probes = self._as_probes(probes)
+        probe_norms = np.einsum("ij,ij->i", probes, probes)[:, None]
+        base, tail = self._parts()
+        split = base[0].shape[0]
+        if rows is None:
+            if tail[0].shape[0] == 0:
+                return _euclidean(probes, probe_norms, base[0], base[1])
+            width = split + tail[0].shape[0]
+            parts = [(slice(0, split), base[0], base[1]), (slice(split, width), tail[0], tail[1])]
+        else:
+            rows = np.asarray(rows, dtype=np.int64)
+            in_base = rows < split
+            from_base, from_tail = rows[in_base], rows[~in_base] - split
+            width = rows.shape[0]
+            parts = [(in_base, base[0][from_base], base[1][from_base]),
+                     (~in_base, tail[0][from_tail], tail[1][from_tail])]
+
+        out = np.empty((probes.shape[0], width), dtype=np.float32)
+        for columns, matrix, sq_norms in parts:
+            if matrix.shape[0]:
+                out[:, columns] = _euclidean(probes, probe_norms, matrix, sq_norms)
+        return out
+
+    def search(self, probes, k=1):
+        """ Top-k gallery rows and distances for every probe: (M, k) int, (M, k) float """
+        probes = self._as_probes(probes)
+        if len(self) == 0 or probes.shape[0] == 0:
+            return (np.empty((probes.shape[0], 0), dtype=np.int64),
+                    np.empty((probes.shape[0], 0), dtype=np.float32))
+
+        if self.index is not None:
+            return self.index.search(probes, k)
+
+        dists = self.distances(probes)
+        return _top_k(dists, k)
+
+    def identify(self, probes, threshold, k=1):
+        """
+        Returns one (name, distance) per probe. Names beyond the threshold are
+        "Unknown", matching the semantics of the old per-face argmin loop.
+        """
+        idx, dists = self.search(probes, k)
+        results = []
+        for row_idx, row_dist in zip(idx, dists):
+            if row_idx.size and row_dist[0] < threshold:
+                results.append((self.name_of(row_idx[0]), float(row_dist[0])))
+            else:
+                results.append(("Unknown", float(row_dist[0]) if row_dist.size else 1.0))
+        return results
+
+
+def _top_k(dists, k):
+    """ Smallest-k columns per row, sorted ascending """
+    k = min(k, dists.shape[1])
+    if k == 1:
+        idx = np.argmin(dists, axis=1)[:, None]
+    else:
+        idx = np.argpartition(dists, k - 1, axis=1)[:, :k]
+        order = np.argsort(np.take_along_axis(dists, idx, axis=1), axis=1)
+        idx = np.take_along_axis(idx, order, axis=1)
+    return idx, np.take_along_axis(dists, idx, axis=1)
@@ -0,0 +1,193 @@
+"""
+Append-only enrollment journal.
+
+An enrollment writes its own samples as a small segment (same format as the
+gallery store) into data/encodings.journal/, so it costs O(its own vectors)
+and concurrent enrollments never overwrite each other. Readers merge the
+base gallery with the journal tail. Compaction folds segments into the base
+in the background and records their names in the new base's metadata, so a
+reader never counts a segment twice even while compaction is deleting it.
+
+    python -m recognition.journal compact [encodings.bin]
+"""
+import os
+import sys
+import time
+import uuid
+import threading
+
+from recognition.gallery import GalleryMatcher
+from recognition.store import (load_gallery, open_gallery, publish_gallery, remove_old_generations,
+                               resolve_gallery, write_encodings)
+
+SEGMENT_SUFFIX = ".seg"
+LOCK_NAME = "compact.lock"
+STALE_LOCK_SECONDS = 600
+COMPACT_MIN_SEGMENTS = 8
+COMPACT_INTERVAL = 60.0
+
+
+def journal_dir_for(gallery_file):
+    """ data/encodings.bin -> data/encodings.journal/ """
+    return os.path.splitext(gallery_file)[0] + ".journal"
+
+
+def _fsync_dir(path):
+    # Make the rename itself durable; directories cannot be opened on Windows
+    if os.name != "posix":
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def list_segments(gallery_file):
+    journal_dir = journal_dir_for(gallery_file)
+    if not os.path.isdir(journal_dir):
+        return []
+    return sorted(f for f in os.listdir(journal_dir) if f.endswith(SEGMENT_SUFFIX))
+
+
+# ================= WRITE =================
+def append_enrollment(gallery_file, encodings, names):
+    """ Journal new samples as one atomic segment; returns the segment name """
+    if len(names) == 0:
+        return None
+    journal_dir = journal_dir_for(gallery_file)
+    os.makedirs(journal_dir, exist_ok=True)
+    segment = f"{time.time_ns():020d}-{uuid.uuid4().hex[:8]}{SEGMENT_SUFFIX}"
+    write_encodings(os.path.join(journal_dir, segment), encodings, names)
+    _fsync_dir(journal_dir)
+    return segment
+
+
+# ================= READ =================
+def file_version(path):
+    try:
+        st = os.stat(path)
+        return st.st_ino, st.st_mtime_ns, st.st_size
+    except FileNotFoundError:
+        return None
+
+
+def base_version(gallery_file):
+    """ Version of the live generation of the base gallery """
+    path = resolve_gallery(gallery_file)
+    version = file_version(path)
+    return None if version is None else (os.path.basename(path),) + version
+
+
+def read_journaled(gallery_file, legacy_path=None, retries=5):
+    """
+    Consistent snapshot of the base store plus pending segments:
+    (base_store, [(segment_name, segment_store), ...]).
+    Retries if compaction swaps the base underneath us.
+    """
+    journal_dir = journal_dir_for(gallery_file)
+    for _ in range(retries):
+        version = base_version(gallery_file)
+        try:
+            # An old generation can be deleted between resolving and opening it
+            base = load_gallery(gallery_file, legacy_path)
+            compacted = set(base.meta.get("compacted", []))
+            segments = [(name, open_gallery(os.path.join(journal_dir, name)))
+                        for name in list_segments(gallery_file) if name not in compacted]
+        except FileNotFoundError:
+            continue
+        if base_version(gallery_file) == version:
+            return base, segments
+    raise RuntimeError(f"Gallery {gallery_file} kept changing while reading")
+
+
+# ================= COMPACTION =================
+def _acquire_lock(journal_dir):
+    lock = os.path.join(journal_dir, LOCK_NAME)
+    try:
+        if time.time() - os.path.getmtime(lock) > STALE_LOCK_SECONDS:
+            os.remove(lock)
+    except FileNotFoundError:
+        pass
+    try:
+        os.close(os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        return lock
+    except FileExistsError:
+        return None
+
+
+def compact(gallery_file, legacy_path=None):
+    """
+    Fold every pending segment into the base gallery. Returns the number of
+    segments compacted (0 if another process holds the compaction lock).
+    """
+    journal_dir = journal_dir_for(gallery_file)
+    if not os.path.isdir(journal_dir):
+        return 0
+    lock = _acquire_lock(journal_dir)
+    if lock is None:
+        return 0
+
+    try:
+        base, segments = read_journaled(gallery_file, legacy_path)
+
+        # Segments a previous compaction merged but did not get to delete
+        for name in base.meta.get("compacted", []):
+            try:
+                os.remove(os.path.join(journal_dir, name))
+            except FileNotFoundError:
+                pass
+
+        if not segments:
+            remove_old_generations(gallery_file)
+            return 0
+
+        matcher = GalleryMatcher.from_store(base)
+        matcher.extend_stores([segment for _, segment in segments])
+
+        merged = [name for name, _ in segments]
+        # A new generation, never a rename over the mapped one (which Windows refuses)
+        publish_gallery(gallery_file, matcher.matrix, matcher.labels, matcher.identities,
+                        matcher.sq_norms, meta={"compacted": merged})
+        for name in merged:
+            os.remove(os.path.join(journal_dir, name))
+        return len(merged)
+    finally:
+        os.remove(lock)
+
+
+class BackgroundCompactor(threading.Thread):
+    """ Daemon thread that compacts once enough segments have piled up """
+
+    def __init__(self, gallery_file, legacy_path=None, interval=COMPACT_INTERVAL,
+                 min_segments=COMPACT_MIN_SEGMENTS):
+        super().__init__(daemon=True)
+        self.gallery_file = gallery_file
+        self.legacy_path = legacy_path
+        self.interval = interval
+        self.min_segments = min_segments
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                if len(list_segments(self.gallery_file)) >= self.min_segments:
+                    merged = compact(self.gallery_file, self.legacy_path)
+                    if merged:
+                        print(f"[INFO] Compacted {merged} enrollment segments into the gallery")
+            except (OSError, ValueError, RuntimeError) as e:
+                print(f"[WARN] Gallery compaction failed: {e}")
+
+    def stop(self):
+        self._stop_event.set()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "compact":
+        print("Usage: python -m recognition.journal compact [encodings.bin]")
+        sys.exit(1)
+
+    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    target = sys.argv[2] if len(sys.argv) > 2 else os.path.join(base_dir, "data", "encodings.bin")
+    legacy = os.path.splitext(target)[0] + ".pkl"
+    print(f"[INFO] Compacted {compact(target, legacy)} enrollment segments into {target}")
@@ -0,0 +1,52 @@
+"""
+Single-pass 68-point face landmarks.
+
+face_recognition.face_encodings() runs a shape predictor internally and
+face_landmarks() runs another one (again, usually on the full-size frame).
+Here the 68-point shape is predicted once per face on the working-resolution
+image and feeds the liveness checks only.
+
+Descriptors keep face_encodings()' 5-point alignment: every enrolled sample
+was computed that way, and a 68-point-aligned probe shifts every distance
+against the match thresholds. encode_faces() is exactly face_encodings()
+and is used for both enrollment and probes.
+"""
+import numpy as np
+from face_recognition import api as fr_api
+
+# dlib 68-point layout, same grouping as face_recognition.face_landmarks()
+FEATURES = {
+    "chin": range(0, 17),
+    "left_eyebrow": range(17, 22),
+    "right_eyebrow": range(22, 27),
+    "nose_bridge": range(27, 31),
+    "nose_tip": range(31, 36),
+    "left_eye": range(36, 42),
+    "right_eye": range(42, 48),
+    "top_lip": list(range(48, 55)) + [64, 63, 62, 61, 60],
+    "bottom_lip": list(range(54, 60)) + [48, 60, 67, 66, 65, 64],
+}
+
+
+def predict_shapes(rgb, locations):
+    """ One dlib 68-point full_object_detection per (top, right, bottom, left) box """
+    return [fr_api.pose_predictor_68_point(rgb, fr_api._css_to_rect(loc)) for loc in locations]
+
+
+def shape_points(shape, scale=1.0):
+    """ (68, 2) float32 array of (x, y), optionally rescaled (e.g. to full-frame pixels) """
+    points = np.array([(p.x, p.y) for p in shape.parts()], dtype=np.float32)
+    return points * scale if scale != 1.0 else points
+
+
+def encode_faces(rgb, locations, num_jitters=1):
+    """ 128-d descriptors with the 5-point alignment the gallery was enrolled with """
+    return [np.array(fr_api.face_encoder.compute_face_descriptor(
+                rgb, fr_api.pose_predictor_5_point(rgb, fr_api._css_to_rect(loc)), num_jitters))
+            for loc in locations]
+
+
+def landmark_dict(points):
+    """ face_recognition.face_landmarks()-style dict from a (68, 2) array """
+    pts = [(int(round(x)), int(round(y))) for x, y in points]
+    return {feature: [pts[i] for i in idx] for feature, idx in FEATURES.items()}
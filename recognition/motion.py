@@ -0,0 +1,57 @@
+"""
+Cheap scene-change gate in front of face detection.
+
+Each frame is shrunk to a tiny blurred grayscale thumbnail and compared with
+a running-average background. Detection only needs to run when a noticeable
+fraction of the thumbnail changed, while faces are being tracked, or when
+the gate has been closed for longer than max_idle_seconds (so slow changes
+such as someone walking up very carefully are still caught).
+"""
+import time
+import cv2
+import numpy as np
+
+
+class MotionGate:
+    def __init__(self, sensitivity=0.01, pixel_delta=18, max_idle_seconds=2.0,
+                 size=(64, 48), learning_rate=0.05, clock=time.monotonic):
+        self.sensitivity = sensitivity          # fraction of changed pixels that opens the gate
+        self.pixel_delta = pixel_delta          # grey-level change that counts as "changed"
+        self.max_idle_seconds = max_idle_seconds
+        self.size = size
+        self.learning_rate = learning_rate
+        self.clock = clock
+        self.background = None
+        self.last_open = None
+        self.last_change = 0.0
+        self.skipped = 0
+
+    def _thumbnail(self, frame):
+        small = cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(small, (5, 5), 0)
+
+    def changed_fraction(self, thumb):
+        diff = cv2.absdiff(thumb, cv2.convertScaleAbs(self.background))
+        return float(np.count_nonzero(diff > self.pixel_delta)) / diff.size
+
+    def should_process(self, frame, active=False):
+        """ True if detection should run on this frame; active=True keeps the gate open """
+        thumb = self._thumbnail(frame)
+        now = self.clock()
+
+        if self.background is None:
+            self.background = thumb.astype(np.float32)
+            self.last_open = now
+            return True
+
+        self.last_change = self.changed_fraction(thumb)
+        cv2.accumulateWeighted(thumb, self.background, self.learning_rate)
+
+        if active or self.last_change >= self.sensitivity or now - self.last_open >= self.max_idle_seconds:
+            self.last_open = now
+            return True
+
+        self.skipped += 1
+        return False
@@ -0,0 +1,76 @@
+import numpy as np
+
+from recognition.gallery import EMBEDDING_DIM, _top_k
+
+DEFAULT_SHORTLIST = 3
+
+
+class PrototypeIndex:
+    """
+    Two-stage matcher over a GalleryMatcher.
+
+    Stage one ranks identities by distance to their centroid (one prototype per
+    identity instead of ~20 burst samples). Stage two computes exact per-sample
+    distances for the `shortlist` best identities only, so the final decision
+    is still "closest enrolled sample < threshold".
+    Centroids are kept as running sums and updated incrementally on enrollment.
+    """
+
+    def __init__(self, matcher, shortlist=DEFAULT_SHORTLIST):
+        self.matcher = matcher
+        self.shortlist = shortlist
+        self.sums = np.empty((0, EMBEDDING_DIM), dtype=np.float64)
+        self.counts = np.empty(0, dtype=np.int64)
+        self.centroids = np.empty((0, EMBEDDING_DIM), dtype=np.float32)
+        self.members = []             # label -> gallery rows
+        self.indexed = 0
+        self.add(0)
+
+    def __len__(self):
+        return self.indexed
+
+    def add(self, start):
+        """ Fold gallery rows [start:] into the per-identity sums and member lists """
+        matrix, _, new_labels = self.matcher.rows(start)
+        end = start + matrix.shape[0]
+        if end <= start:
+            return
+
+        identities = self.matcher.identity_count
+        grow = identities - self.counts.shape[0]
+        if grow > 0:
+            self.sums = np.vstack([self.sums, np.zeros((grow, self.sums.shape[1]))])
+            self.counts = np.concatenate([self.counts, np.zeros(grow, dtype=np.int64)])
+            self.members.extend(np.empty(0, dtype=np.int64) for _ in range(grow))
+
+        np.add.at(self.sums, new_labels, matrix)
+        self.counts += np.bincount(new_labels, minlength=identities)
+
+        rows = np.arange(start, end)
+        for label in np.unique(new_labels):
+            self.members[label] = np.concatenate([self.members[label], rows[new_labels == label]])
+
+        self.centroids = np.ascontiguousarray(
+            self.sums / np.maximum(self.counts, 1)[:, None], dtype=np.float32)
+        self.indexed = end
+
+    def search(self, probes, k=1):
+        """ Same contract as GalleryMatcher.search: (M, k) rows and exact distances """
+        all_idx = np.full((probes.shape[0], k), -1, dtype=np.int64)
+        all_dists = np.full((probes.shape[0], k), np.inf, dtype=np.float32)
+        if self.centroids.shape[0] == 0:
+            return all_idx, all_dists
+
+        # Stage 1: probes x identity prototypes
+        shortlist = min(self.shortlist, self.centroids.shape[0])
+        c_norms = np.einsum("ij,ij->i", self.centroids, self.centroids)
+        coarse = c_norms[None, :] - 2.0 * (probes @ self.centroids.T)
+        candidates = np.argpartition(coarse, shortlist - 1, axis=1)[:, :shortlist]
+
+        # Stage 2: exact distances to every sample of the shortlisted identities
+        for i, labels in enumerate(candidates):
+            rows = np.concatenate([self.members[label] for label in labels])
+            idx, dists = _top_k(self.matcher.distances(probes[i:i + 1], rows), k)
+            all_idx[i, :idx.shape[1]] = rows[idx[0]]
+            all_dists[i, :idx.shape[1]] = dists[0]
+        return all_idx, all_dists
@@ -0,0 +1,147 @@
+"""
+Shared gallery loading for every scanner and the API.
+
+GalleryService caches one validated GalleryMatcher keyed by the gallery's file
+version (inode, mtime, size of the base store plus the pending journal
+segments). A check costs one stat() and one listdir(); new enrollments are
+folded into a small in-RAM tail next to the memory-mapped base (whose pages
+stay shared between processes), and only a compaction that absorbed segments
+we never saw forces a re-open of the base.
+"""
+import os
+import time
+import threading
+
+from recognition.gallery import GalleryMatcher
+from recognition.store import NameView, open_gallery, resolve_gallery
+from recognition.journal import base_version, journal_dir_for, list_segments, read_journaled
+from recognition.ann import DEFAULT_NPROBE, MIN_INDEXED, index_path_for, load_or_build
+from recognition.prototypes import DEFAULT_SHORTLIST, PrototypeIndex
+
+POLL_INTERVAL = 2.0
+
+
+class GalleryService:
+    """
+    Owns the live GalleryMatcher for one gallery file.
+
+    index: "exact" full scan, "prototype" centroid shortlist + exact re-check,
+    or "ivf" approximate index for very large galleries (built once the
+    gallery reaches MIN_INDEXED samples, exact scan until then).
+    """
+
+    def __init__(self, gallery_file, legacy_path=None, index="prototype",
+                 shortlist=DEFAULT_SHORTLIST, nprobe=DEFAULT_NPROBE, poll_interval=POLL_INTERVAL):
+        self.gallery_file = gallery_file
+        self.legacy_path = legacy_path
+        self.index = index
+        self.shortlist = shortlist
+        self.nprobe = nprobe
+        self.poll_interval = poll_interval
+
+        self._matcher = None
+        self._base_version = None
+        self._compacted = set()      # segments already inside the base we opened
+        self._applied = set()        # segments folded into the matcher since then
+        self._checked = 0.0
+        self._lock = threading.Lock()
+
+    def matcher(self):
+        """ The current matcher, reloading first if the poll interval has elapsed """
+        self.refresh()
+        return self._matcher
+
+    def refresh(self, force=False):
+        """ Pick up enrollments/compactions; returns True if the matcher changed """
+        with self._lock:
+            now = time.monotonic()
+            if self._matcher is not None and not force and now - self._checked < self.poll_interval:
+                return False
+            self._checked = now
+
+            try:
+                if self._matcher is None:
+                    self._full_load()
+                    return True
+
+                version = base_version(self.gallery_file)
+                if version != self._base_version and not self._adopt_compacted_base(version):
+                    self._full_load()
+                    return True
+                return self._apply_new_segments()
+            except (OSError, ValueError, RuntimeError) as e:
+                print(f"[WARN] Gallery reload failed: {e}")
+                if self._matcher is None:
+                    self._matcher = self._with_index(GalleryMatcher())
+                return False
+
+    def _with_index(self, matcher):
+        if matcher.index is not None:
+            return matcher
+        if self.index == "prototype":
+            matcher.use_index(PrototypeIndex(matcher, shortlist=self.shortlist))
+        elif self.index == "ivf" and len(matcher) >= MIN_INDEXED:
+            matcher.use_index(load_or_build(matcher, index_path_for(self.gallery_file), nprobe=self.nprobe))
+        return matcher
+
+    def _full_load(self):
+        version = base_version(self.gallery_file)
+        base, segments = read_journaled(self.gallery_file, self.legacy_path)
+        if version is None:
+            # The legacy pickle was just migrated into a fresh base
+            version = base_version(self.gallery_file)
+
+        # Segments go into the matcher's in-RAM tail in one step; the mapped base is never copied
+        matcher = GalleryMatcher.from_store(base)
+        matcher.extend_stores([segment for _, segment in segments])
+
+        self._matcher = self._with_index(matcher)
+        self._base_version = version
+        self._compacted = set(base.meta.get("compacted", []))
+        self._applied = {name for name, _ in segments}
+
+    def _adopt_compacted_base(self, version):
+        """
+        A compaction that merged exactly the segments we already applied leaves
+        the matcher's contents unchanged, so only the bookkeeping moves.
+        """
+        if version is None:
+            return False
+        compacted = set(open_gallery(resolve_gallery(self.gallery_file)).meta.get("compacted", []))
+        if compacted != self._applied:
+            return False
+        self._base_version = version
+        self._compacted = compacted
+        self._applied = set()
+        return True
+
+    def _apply_new_segments(self):
+        journal_dir = journal_dir_for(self.gallery_file)
+        new = [name for name in list_segments(self.gallery_file)
+               if name not in self._applied and name not in self._compacted]
+        self._matcher.extend_stores([open_gallery(os.path.join(journal_dir, name)) for name in new])
+        self._applied.update(new)
+        if new:
+            # A gallery that started below MIN_INDEXED gets its IVF index once it grows past it
+            self._with_index(self._matcher)
+        return bool(new)
+
+
+# ================= SHARED INSTANCES =================
+_services = {}
+_services_lock = threading.Lock()
+
+
+def get_gallery_service(gallery_file, legacy_path=None, **options):
+    """ One GalleryService per gallery file and configuration within a process """
+    key = (os.path.abspath(gallery_file), legacy_path, tuple(sorted(options.items())))
+    with _services_lock:
+        service = _services.get(key)
+        if service is None:
+            service = _services[key] = GalleryService(gallery_file, legacy_path, **options)
+        return service
+
+
+def encodings_view(matcher):
+    """ {"encodings", "names"} for callers that want the legacy dict shape """
+    return {"encodings": matcher.matrix, "names": NameView(matcher.labels, matcher.identities)}
@@ -0,0 +1,315 @@
+"""
+Versioned binary gallery store (data/encodings.bin).
+
+Layout, little-endian, every section 64-byte aligned:
+
+    header   magic, version, dim, count, identities and section offsets
+    matrix   float32 [count, dim]     -- opened with np.memmap, never copied
+    norms    float32 [count]          -- squared L2 norms for GalleryMatcher
+    labels   int32   [count]          -- row -> identity
+    offsets  uint64  [identities + 1] -- name table: byte offsets into blob
+    blob     utf-8 names, concatenated
+    meta     utf-8 JSON (version 2+), e.g. journal segments already compacted in
+
+Opening a store reads the header and the name table only, so it is near
+constant time whatever the number of enrolled samples.
+
+Rewrites (compaction) never replace a store that readers may have mapped --
+Windows refuses to rename over a mapped file. Each rewrite is a new
+generation file (encodings.<n>.bin) and the small pointer file
+encodings.bin.current names the live one; resolve_gallery() follows it.
+Old generations are deleted once nobody maps them any more.
+
+Migrate a legacy pickle with:  python -m recognition.store migrate [encodings.pkl] [encodings.bin]
+"""
+import os
+import sys
+import glob
+import json
+import time
+import struct
+import pickle
+from collections.abc import Sequence
+import numpy as np
+
+MAGIC = b"FACEGAL\0"
+VERSION = 2
+EMBEDDING_DIM = 128
+HEADER = struct.Struct("<8sIIQQQQQQQQQ")
+HEADER_SIZE = 128
+ALIGN = 64
+CURRENT_SUFFIX = ".current"
+REPLACE_RETRIES = 20   # pointer swaps racing a reader on Windows
+
+
+def gallery_path_for(encodings_file):
+    """ data/encodings.pkl -> data/encodings.bin """
+    return os.path.splitext(encodings_file)[0] + ".bin"
+
+
+def current_path_for(gallery_file):
+    """ data/encodings.bin -> data/encodings.bin.current (names the live generation) """
+    return gallery_file + CURRENT_SUFFIX
+
+
+def resolve_gallery(gallery_file):
+    """ Path of the live generation of a gallery (the file itself until it is first rewritten) """
+    try:
+        with open(current_path_for(gallery_file), encoding="utf-8") as f:
+            name = f.read().strip()
+    except FileNotFoundError:
+        return gallery_file
+    return os.path.join(os.path.dirname(os.path.abspath(gallery_file)), name) if name else gallery_file
+
+
+def gallery_exists(gallery_file):
+    return os.path.exists(current_path_for(gallery_file)) or os.path.exists(gallery_file)
+
+
+def _replace(src, dst):
+    # On Windows a reader holding dst open for a moment makes the rename fail; wait it out
+    for attempt in range(REPLACE_RETRIES):
+        try:
+            os.replace(src, dst)
+            return
+        except PermissionError:
+            if attempt == REPLACE_RETRIES - 1:
+                raise
+            time.sleep(0.05)
+
+
+def _align(offset):
+    return (offset + ALIGN - 1) // ALIGN * ALIGN
+
+
+class NameView(Sequence):
+    """ Per-row names resolved through labels, without building an N-long list """
+
+    def __init__(self, labels, identities):
+        self.labels = labels
+        self.identities = identities
+
+    def __len__(self):
+        return self.labels.shape[0]
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return [self.identities[label] for label in self.labels[row]]
+        return self.identities[self.labels[row]]
+
+
+class GalleryStore:
+    """ An opened gallery: memory-mapped matrix/norms/labels plus the identity names """
+
+    def __init__(self, matrix, sq_norms, labels, identities, path=None, meta=None):
+        self.matrix = matrix
+        self.sq_norms = sq_norms
+        self.labels = labels
+        self.identities = identities
+        self.path = path
+        self.meta = meta or {}
+
+    @classmethod
+    def empty(cls, path=None):
+        return cls(np.empty((0, EMBEDDING_DIM), dtype=np.float32),
+                   np.empty(0, dtype=np.float32),
+                   np.empty(0, dtype=np.int32),
+                   [], path)
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    @property
+    def names(self):
+        return NameView(self.labels, self.identities)
+
+
+# ================= WRITE =================
+def write_gallery(path, matrix, labels, identities, sq_norms=None, meta=None):
+    """ Atomically write a store: tmp file, fsync, rename """
+    matrix = np.ascontiguousarray(matrix, dtype=np.float32).reshape(-1, EMBEDDING_DIM)
+    labels = np.ascontiguousarray(labels, dtype=np.int32)
+    if sq_norms is None:
+        sq_norms = np.einsum("ij,ij->i", matrix, matrix)
+    sq_norms = np.ascontiguousarray(sq_norms, dtype=np.float32)
+
+    encoded = [name.encode("utf-8") for name in identities]
+    name_offsets = np.zeros(len(encoded) + 1, dtype=np.uint64)
+    name_offsets[1:] = np.cumsum([len(b) for b in encoded]) if encoded else []
+
+    count = matrix.shape[0]
+    matrix_off = HEADER_SIZE
+    norms_off = _align(matrix_off + matrix.nbytes)
+    labels_off = _align(norms_off + sq_norms.nbytes)
+    names_off = _align(labels_off + labels.nbytes)
+    blob = b"".join(encoded)
+    meta_blob = json.dumps(meta).encode("utf-8") if meta else b""
+    meta_off = names_off + name_offsets.nbytes + len(blob)
+
+    header = HEADER.pack(MAGIC, VERSION, EMBEDDING_DIM, count, len(encoded),
+                         matrix_off, norms_off, labels_off, names_off,
+                         len(blob), meta_off, len(meta_blob))
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(header.ljust(HEADER_SIZE, b"\0"))
+        for offset, section in ((matrix_off, matrix), (norms_off, sq_norms),
+                                (labels_off, labels), (names_off, name_offsets)):
+            f.seek(offset)
+            f.write(section.tobytes())
+        f.write(blob)
+        f.write(meta_blob)
+        f.flush()
+        os.fsync(f.fileno())
+    _replace(tmp, path)
+
+
+def _generations(gallery_file):
+    root, ext = os.path.splitext(gallery_file)
+    return [gallery_file] + glob.glob(f"{glob.escape(root)}.[0-9]*{ext}")
+
+
+def remove_old_generations(gallery_file):
+    """ Delete superseded generations; ones still mapped somewhere (Windows) are retried next time """
+    live = os.path.abspath(resolve_gallery(gallery_file))
+    removed = 0
+    for path in _generations(gallery_file):
+        if os.path.abspath(path) == live:
+            continue
+        try:
+            os.remove(path)
+            removed += 1
+        except (FileNotFoundError, PermissionError):
+            pass
+    return removed
+
+
+def publish_gallery(gallery_file, matrix, labels, identities, sq_norms=None, meta=None):
+    """
+    Rewrite a live gallery: write a new generation, then switch the pointer.
+    Readers keep their mapping of the old generation until they reload.
+    """
+    root, ext = os.path.splitext(gallery_file)
+    generation = f"{root}.{time.time_ns()}{ext}"
+    write_gallery(generation, matrix, labels, identities, sq_norms, meta)
+
+    pointer = current_path_for(gallery_file)
+    tmp = f"{pointer}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(os.path.basename(generation))
+        f.flush()
+        os.fsync(f.fileno())
+    _replace(tmp, pointer)
+    remove_old_generations(gallery_file)
+    return generation
+
+
+def _label_rows(encodings, names):
+    identities, labels, label_of = [], [], {}
+    for name in names:
+        if name not in label_of:
+            label_of[name] = len(identities)
+            identities.append(name)
+        labels.append(label_of[name])
+    return np.asarray(encodings, dtype=np.float32).reshape(-1, EMBEDDING_DIM), labels, identities
+
+
+def write_encodings(path, encodings, names):
+    """ Write a store from parallel encodings / per-row names """
+    write_gallery(path, *_label_rows(encodings, names))
+
+
+# ================= READ =================
+def open_gallery(path):
+    """ Map a store without copying its matrix; a missing file is an empty gallery """
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return GalleryStore.empty(path)
+
+    with open(path, "rb") as f:
+        # Version 1 headers are zero-padded where meta_off/meta_len now live
+        raw = f.read(HEADER.size)
+        (magic, version, dim, count, identity_count, matrix_off, norms_off,
+         labels_off, names_off, blob_len, meta_off, meta_len) = HEADER.unpack(raw)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a gallery store")
+        if version > VERSION:
+            raise ValueError(f"{path} has unsupported gallery version {version}")
+
+        f.seek(names_off)
+        name_offsets = np.frombuffer(f.read(8 * (identity_count + 1)), dtype=np.uint64)
+        blob = f.read(blob_len)
+        meta = {}
+        if meta_len:
+            f.seek(meta_off)
+            meta = json.loads(f.read(meta_len).decode("utf-8"))
+
+    identities = [blob[name_offsets[i]:name_offsets[i + 1]].decode("utf-8")
+                  for i in range(identity_count)]
+    if count == 0:
+        store = GalleryStore.empty(path)
+        store.identities = identities
+        store.meta = meta
+        return store
+
+    matrix = np.memmap(path, dtype=np.float32, mode="r", offset=matrix_off, shape=(count, dim))
+    sq_norms = np.memmap(path, dtype=np.float32, mode="r", offset=norms_off, shape=(count,))
+    labels = np.memmap(path, dtype=np.int32, mode="r", offset=labels_off, shape=(count,))
+    return GalleryStore(matrix, sq_norms, labels, identities, path, meta)
+
+
+def load_gallery(path, legacy_path=None):
+    """ Open the live generation of a store, migrating the legacy pickle on first use """
+    if not gallery_exists(path) and legacy_path and os.path.exists(legacy_path):
+        migrate_pickle(legacy_path, path)
+    return open_gallery(resolve_gallery(path))
+
+
+# ================= MIGRATION =================
+def read_legacy_pickle(path):
+    """
+    Parse either legacy layout into validated parallel lists:
+    {"encodings": [...], "names": [...]} or the older {name: [encs]}.
+    """
+    encodings, names = [], []
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return encodings, names
+
+    with open(path, "rb") as f:
+        data = pickle.load(f)
+    if not isinstance(data, dict):
+        return encodings, names
+
+    if "encodings" in data and "names" in data:
+        pairs = zip(data["encodings"], data["names"])
+    else:
+        pairs = ((enc, name) for name, encs in data.items() if isinstance(encs, list) for enc in encs)
+
+    for enc, name in pairs:
+        if hasattr(enc, "shape") and enc.shape == (EMBEDDING_DIM,):
+            encodings.append(enc)
+            names.append(name)
+    return encodings, names
+
+
+def migrate_pickle(pickle_path, store_path):
+    """ One-shot conversion of a legacy encodings.pkl; returns the number of samples kept """
+    encodings, names = read_legacy_pickle(pickle_path)
+    if gallery_exists(store_path):
+        # Re-migrating over a live gallery: scanners may have it mapped
+        publish_gallery(store_path, *_label_rows(encodings, names))
+    else:
+        write_encodings(store_path, encodings, names)
+    return len(encodings)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "migrate":
+        print("Usage: python -m recognition.store migrate [encodings.pkl] [encodings.bin]")
+        sys.exit(1)
+
+    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    src = sys.argv[2] if len(sys.argv) > 2 else os.path.join(base_dir, "data", "encodings.pkl")
+    dst = sys.argv[3] if len(sys.argv) > 3 else gallery_path_for(src)
+    kept = migrate_pickle(src, dst)
+    print(f"[INFO] Migrated {kept} face encodings from {src} to {dst}")
@@ -0,0 +1,161 @@
+"""
+Lightweight multi-face tracker.
+
+Detections are associated with existing tracks by IoU (falling back to
+centroid distance for fast movers), giving each face a stable track id. A
+track caches its identity, so the 128-d encoding only has to be recomputed
+when the track is new, its last match was uncertain (close to the
+threshold), or it is due for a periodic re-verification.
+
+Boxes use face_recognition's (top, right, bottom, left) order in whatever
+coordinates the caller detects in.
+"""
+import itertools
+import numpy as np
+
+try:
+    import cv2
+except ImportError:
+    cv2 = None
+
+
+class Track:
+    def __init__(self, track_id, box, frame_index):
+        self.track_id = track_id
+        self.box = box
+        self.name = None              # None until the first encoding/match
+        self.distance = None
+        self.last_encoded = None
+        self.first_seen = frame_index
+        self.misses = 0
+
+    @property
+    def identified(self):
+        return self.name is not None
+
+
+def iou_matrix(boxes_a, boxes_b):
+    """ Pairwise IoU for (top, right, bottom, left) boxes: (len(a), len(b)) """
+    a = np.asarray(boxes_a, dtype=np.float32).reshape(-1, 4)
+    b = np.asarray(boxes_b, dtype=np.float32).reshape(-1, 4)
+    top = np.maximum(a[:, None, 0], b[None, :, 0])
+    right = np.minimum(a[:, None, 1], b[None, :, 1])
+    bottom = np.minimum(a[:, None, 2], b[None, :, 2])
+    left = np.maximum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(right - left, 0, None) * np.clip(bottom - top, 0, None)
+    area_a = (a[:, 1] - a[:, 3]) * (a[:, 2] - a[:, 0])
+    area_b = (b[:, 1] - b[:, 3]) * (b[:, 2] - b[:, 0])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-6), 0.0)
+
+
+def _centres(boxes):
+    b = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    return np.stack([(b[:, 1] + b[:, 3]) / 2, (b[:, 0] + b[:, 2]) / 2], axis=1), b[:, 1] - b[:, 3]
+
+
+class FaceTracker:
+    def __init__(self, threshold, iou_threshold=0.3, max_misses=5, reverify_every=15,
+                 uncertain_margin=0.05, use_optical_flow=False):
+        self.threshold = threshold
+        self.iou_threshold = iou_threshold
+        self.max_misses = max_misses
+        self.reverify_every = reverify_every
+        self.uncertain_margin = uncertain_margin
+        self.use_optical_flow = use_optical_flow and cv2 is not None
+        self.tracks = []
+        self.frame_index = 0
+        self._ids = itertools.count(1)
+        self._prev_gray = None
+
+    def _associate(self, boxes):
+        """ Greedy one-to-one assignment: best IoU first, then nearest centre """
+        pairs = {}
+        if not self.tracks or not boxes:
+            return pairs
+        track_boxes = [t.box for t in self.tracks]
+        iou = iou_matrix(track_boxes, boxes)
+        t_centres, t_widths = _centres(track_boxes)
+        d_centres, _ = _centres(boxes)
+        dist = np.linalg.norm(t_centres[:, None] - d_centres[None], axis=2)
+        # A face that moved less than half its width is the same face
+        close = dist < 0.5 * t_widths[:, None]
+
+        score = np.where(iou >= self.iou_threshold, 1.0 + iou, np.where(close, 1.0 - dist / (t_widths[:, None] + 1e-6), -1.0))
+        while True:
+            t, d = np.unravel_index(np.argmax(score), score.shape)
+            if score[t, d] < 0:
+                break
+            pairs[d] = self.tracks[t]
+            score[t, :] = -1.0
+            score[:, d] = -1.0
+        return pairs
+
+    def update(self, boxes, gray=None):
+        """ Associate this frame's detections; returns one Track per box, in order """
+        self.frame_index += 1
+        boxes = [tuple(int(v) for v in box) for box in boxes]
+        pairs = self._associate(boxes)
+
+        result = []
+        for i, box in enumerate(boxes):
+            track = pairs.get(i)
+            if track is None:
+                track = Track(next(self._ids), box, self.frame_index)
+                self.tracks.append(track)
+            track.box = box
+            track.misses = 0
+            result.append(track)
+
+        matched = {id(t) for t in result}
+        for track in self.tracks:
+            if id(track) not in matched:
+                track.misses += 1
+        self.tracks = [t for t in self.tracks if t.misses <= self.max_misses]
+
+        if gray is not None:
+            self._prev_gray = gray
+        return result
+
+    def needs_encoding(self, track):
+        if not track.identified or track.last_encoded is None:
+            return True
+        if abs(track.distance - self.threshold) < self.uncertain_margin:
+            return True
+        return self.frame_index - track.last_encoded >= self.reverify_every
+
+    def trusted_boxes(self):
+        """ Boxes of live tracks whose identity can be reused without re-encoding """
+        return [t.box for t in self.tracks if t.misses == 0 and not self.needs_encoding(t)]
+
+    def assign(self, track, name, distance):
+        track.name = name
+        track.distance = distance
+        track.last_encoded = self.frame_index
+
+    def predict(self, gray):
+        """
+        Optional optical-flow step for frames where detection is skipped: shift
+        every live track by the median Lucas-Kanade motion of corners inside it.
+        """
+        if not self.use_optical_flow or self._prev_gray is None or not self.tracks:
+            self._prev_gray = gray
+            return [t for t in self.tracks if t.misses == 0]
+
+        for track in self.tracks:
+            top, right, bottom, left = track.box
+            mask = np.zeros_like(gray)
+            mask[max(top, 0):max(bottom, 0), max(left, 0):max(right, 0)] = 255
+            points = cv2.goodFeaturesToTrack(self._prev_gray, 20, 0.01, 3, mask=mask)
+            if points is None:
+                continue
+            moved, status, _ = cv2.calcOpticalFlowPyrLK(self._prev_gray, gray, points, None)
+            ok = status.reshape(-1) == 1
+            if not ok.any():
+                continue
+            dx, dy = np.median((moved - points).reshape(-1, 2)[ok], axis=0)
+            dx, dy = int(round(dx)), int(round(dy))
+            track.box = (top + dy, right + dx, bottom + dy, left + dx)
+
+        self._prev_gray = gray
+        return [t for t in self.tracks if t.misses == 0]
@@ -1,22 +1,30 @@
 import cv2
-import face_recognition
-import pickle
 import numpy as np
-import pandas as pd
 import os
+import sys
+import json
+import time
+import signal
+import argparse
+import threading
+from collections import deque
 from datetime import datetime
-from scipy.spatial import distance as dist
+from recognition.store import gallery_path_for
+from recognition.journal import BackgroundCompactor
+from recognition.service import get_gallery_service
+from recognition.tracker import FaceTracker
+from recognition.engine import RecognitionEngine, default_workers, track_faces
+from recognition.capture import CameraStream
+from recognition.motion import MotionGate
+from recognition.adaptive import AdaptiveScaler, DetectionPlanner
+from records.punch_state import get_punch_index
+from security.sessions import SessionManager
 
 # ===================== SAFE OPTIONAL IMPORTS =====================
 try:
-    from spoof_detection import is_blink
+    from utils import queue_for_cloud
 except ImportError:
-    is_blink = None  # fallback
-
-try:
-    from utils import send_to_cloud
-except ImportError:
-    def send_to_cloud(payload):
+    def queue_for_cloud(payload):
         return False  # safe fallback
 # ================================================================
 
@@ -24,48 +32,72 @@ except ImportError:
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
 ENCODINGS_FILE = os.path.join(BASE_DIR, "data", "encodings.pkl")
+GALLERY_FILE = gallery_path_for(ENCODINGS_FILE)
 ATTENDANCE_FILE = os.path.join(BASE_DIR, "attendance", "attendance.csv")
 
 FACE_THRESHOLD = 0.5
 EYE_AR_THRESHOLD = 0.25
 EYE_AR_CONSEC_FRAMES = 3
+PUNCH_COOLDOWN_SECONDS = 10.0   # per identity; everyone else keeps being scanned
+
+# Gallery search: "exact" full scan, "prototype" centroid shortlist + exact
+# re-check, or "ivf" approximate index for very large galleries
+MATCH_INDEX = "prototype"
+PROTOTYPE_SHORTLIST = 3
+ANN_NPROBE = 8
+GALLERY_POLL_SECONDS = 2.0   # how quickly new enrollments reach the running scanner
+
+# Tracking: identified faces keep their identity between frames and are only
+# re-encoded when new, near the threshold, or every TRACK_REVERIFY_FRAMES
+TRACK_REVERIFY_FRAMES = 15
+TRACK_UNCERTAIN_MARGIN = 0.05
+TRACK_OPTICAL_FLOW = False   # move boxes with LK flow on frames without detection
+
+# Motion gate: skip detection while the scene is static and nobody is tracked
+MOTION_SENSITIVITY = 0.01    # fraction of the thumbnail that must change
+MOTION_MAX_IDLE_SECONDS = 2.0
+
+# Detection/encoding/landmarks run in a process pool; frames beyond
+# RECOGNITION_MAX_PENDING in flight are dropped rather than queued
+RECOGNITION_WORKERS = default_workers()
+RECOGNITION_MAX_PENDING = None   # default: 2 per worker
+
+# Face detector: "hog", "haar", "yunet", "ssd", or a "proposer+confirmer" cascade
+# such as "haar+hog". DNN model paths: e.g. {"yunet_model": "models/yunet.onnx"}
+DETECTOR = "hog"
+DETECTOR_OPTIONS = {}
+
+# Adaptive resolution: the working scale follows face sizes (faces resized to
+# about TARGET_FACE_PX tall) within a per-frame detection-time budget. Between full-frame
+# sweeps every FULL_SWEEP_EVERY submitted frames, only padded regions around
+# tracked faces are searched.
+TARGET_FACE_PX = 64
+DETECTION_BUDGET_MS = 80.0
+FULL_SWEEP_EVERY = 10
+
+# Kiosk / service operation (all overridable from the command line, see --help)
+CAMERA_SOURCE = "0"          # device index, or a video file / stream URL
+STATS_INTERVAL_SECONDS = 60.0
+PUNCH_RATE_WINDOW = 60.0     # seconds covered by the punches/min figure
 # =================================================
 
-os.makedirs(os.path.dirname(ATTENDANCE_FILE), exist_ok=True)
-
-# ===================== LOAD ENCODINGS =====================
-known_encodings = []
-known_names = []
-
-if os.path.exists(ENCODINGS_FILE) and os.path.getsize(ENCODINGS_FILE) > 0:
-    with open(ENCODINGS_FILE, "rb") as f:
-        data = pickle.load(f)
+# ===================== LOGGING =====================
+LOG_JSON = False   # one JSON object per line (set by --log-format json)
 
-    # Supports BOTH old and new encoding formats
-    if isinstance(data, dict):
-        if "encodings" in data and "names" in data:
-            for enc, name in zip(data["encodings"], data["names"]):
-                known_encodings.append(enc)
-                known_names.append(name)
-        else:
-            for name, encs in data.items():
-                for enc in encs:
-                    known_encodings.append(enc)
-                    known_names.append(name)
-
-print(f"[INFO] Loaded {len(known_encodings)} face encodings")
+def log(event, level="INFO", **fields):
+    """ Structured log line: JSON for services/collectors, readable text otherwise """
+    if LOG_JSON:
+        record = {"ts": datetime.now().astimezone().isoformat(timespec="milliseconds"),
+                  "level": level, "event": event, **fields}
+        print(json.dumps(record, default=str), flush=True)
+    else:
+        details = " ".join(f"{key}={value}" for key, value in fields.items())
+        print(f"[{level}] {event} {details}".rstrip(), flush=True)
 
 # ===================== ATTENDANCE FILE =====================
-if not os.path.exists(ATTENDANCE_FILE) or os.path.getsize(ATTENDANCE_FILE) == 0:
-    df = pd.DataFrame(columns=["Name", "Date", "Time", "Type"])
-    df.to_csv(ATTENDANCE_FILE, index=False)
-
-# ===================== BLINK HELPERS =====================
-def eye_aspect_ratio(eye):
-    A = dist.euclidean(eye[1], eye[5])
-    B = dist.euclidean(eye[2], eye[4])
-    C = dist.euclidean(eye[0], eye[3])
-    return (A + B) / (2.0 * C)
+# Append-only ledger (created with its header on first run) + today's punch state
+def punches():
+    return get_punch_index(ATTENDANCE_FILE)
 
 # ===================== ATTENDANCE =====================
 def mark_attendance(name):
@@ -73,16 +105,11 @@ def mark_attendance(name):
     date = now.strftime("%Y-%m-%d")
     time = now.strftime("%H:%M:%S")
 
-    df = pd.read_csv(ATTENDANCE_FILE)
-
-    today_records = df[(df["Name"] == name) & (df["Date"] == date)]
-
-    record_type = "Punch-In" if len(today_records) == 0 else (
-        "Punch-Out" if today_records.iloc[-1]["Type"] == "Punch-In" else "Punch-In"
-    )
-
-    df.loc[len(df)] = [name, date, time, record_type]
-    df.to_csv(ATTENDANCE_FILE, index=False)
+    record_type = punches().punch(name, now)
+    if record_type is None:
+        # Punched moments ago (maybe by another scanner): nothing to record
+        log("duplicate_punch", name=name, timestamp=f"{date} {time}")
+        return None
 
     payload = {
         "name": name,
@@ -90,92 +117,266 @@ def mark_attendance(name):
         "type": record_type
     }
 
-    cloud_status = send_to_cloud(payload)
-    print(f"[ATTENDANCE] {name} | {record_type} | {'Cloud' if cloud_status else 'Local'}")
+    # Local outbox write only; the background sender syncs it to the backend
+    cloud_status = queue_for_cloud(payload)
+    log("attendance", name=name, type=record_type, timestamp=payload["timestamp"],
+        cloud="queued" if cloud_status else "local")
 
     return record_type
 
-# ===================== CAMERA SAFE INIT =====================
-cap = cv2.VideoCapture(0)
-
-if not cap.isOpened():
-    print("[ERROR] Camera not accessible (cloud environment?)")
-    exit(0)
-
-blink_counter = 0
-blink_detected = False
-process_this_frame = True
+# ===================== METRICS =====================
+class PunchRate:
+    """ Punches in the last `window` seconds, scaled to punches per minute """
+
+    def __init__(self, window=PUNCH_RATE_WINDOW, clock=time.monotonic):
+        self.window = window
+        self.clock = clock
+        self.started = clock()
+        self.total = 0
+        self._times = deque()
+
+    def record(self):
+        self.total += 1
+        self._times.append(self.clock())
+
+    def per_minute(self):
+        now = self.clock()
+        while self._times and now - self._times[0] > self.window:
+            self._times.popleft()
+        span = min(self.window, max(now - self.started, 1e-6))
+        return len(self._times) * 60.0 / span
+
+# ===================== COMMAND LINE =====================
+def _option(text):
+    """ KEY=VALUE detector option; numbers are converted """
+    key, sep, value = text.partition("=")
+    if not sep:
+        raise argparse.ArgumentTypeError(f"expected KEY=VALUE, got {text!r}")
+    try:
+        value = float(value) if "." in value else int(value)
+    except ValueError:
+        pass
+    return key, value
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Face attendance scanner. Runs continuously; "
+                                                 "--headless turns it into a kiosk/service process.")
+    parser.add_argument("--camera", default=CAMERA_SOURCE, help="device index, video file or stream URL")
+    parser.add_argument("--width", type=int, help="requested capture width")
+    parser.add_argument("--height", type=int, help="requested capture height")
+    parser.add_argument("--headless", action="store_true", help="no preview window (kiosk/service mode)")
+    parser.add_argument("--log-format", choices=["text", "json"], default="text")
+    parser.add_argument("--stats-interval", type=float, default=STATS_INTERVAL_SECONDS,
+                        help="seconds between stats lines (0 disables)")
+
+    parser.add_argument("--threshold", type=float, default=FACE_THRESHOLD, help="match distance threshold")
+    parser.add_argument("--cooldown", type=float, default=PUNCH_COOLDOWN_SECONDS,
+                        help="seconds before the same person can punch again")
+    parser.add_argument("--ear-threshold", type=float, default=EYE_AR_THRESHOLD)
+    parser.add_argument("--blink-frames", type=int, default=EYE_AR_CONSEC_FRAMES)
+
+    parser.add_argument("--match-index", choices=["exact", "prototype", "ivf"], default=MATCH_INDEX)
+    parser.add_argument("--shortlist", type=int, default=PROTOTYPE_SHORTLIST)
+    parser.add_argument("--nprobe", type=int, default=ANN_NPROBE)
+    parser.add_argument("--gallery-poll", type=float, default=GALLERY_POLL_SECONDS)
+
+    parser.add_argument("--workers", type=int, default=RECOGNITION_WORKERS, help="0 runs recognition inline")
+    parser.add_argument("--max-pending", type=int, default=RECOGNITION_MAX_PENDING)
+    parser.add_argument("--detector", default=DETECTOR, help='e.g. hog, haar, yunet, ssd, "haar+hog"')
+    parser.add_argument("--detector-option", type=_option, action="append",
+                        default=list(DETECTOR_OPTIONS.items()), metavar="KEY=VALUE",
+                        help="e.g. yunet_model=models/yunet.onnx (repeatable)")
+    parser.add_argument("--target-face", type=int, default=TARGET_FACE_PX)
+    parser.add_argument("--budget-ms", type=float, default=DETECTION_BUDGET_MS)
+    parser.add_argument("--full-sweep-every", type=int, default=FULL_SWEEP_EVERY)
+    parser.add_argument("--optical-flow", action="store_true", default=TRACK_OPTICAL_FLOW)
+    return parser.parse_args(argv)
 
 # ===================== MAIN LOOP =====================
-while True:
-    ret, frame = cap.read()
-    if not ret:
-        break
-
-    small_frame = cv2.resize(frame, (0, 0), fx=0.25, fy=0.25)
-    rgb_small = cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB)
-
-    if process_this_frame:
-        face_locations = face_recognition.face_locations(rgb_small, model="hog")
-        face_encodings = face_recognition.face_encodings(rgb_small, face_locations)
-
-        scaled_locations = [(t*4, r*4, b*4, l*4) for t, r, b, l in face_locations]
-        face_landmarks = face_recognition.face_landmarks(frame, scaled_locations)
-
-    process_this_frame = not process_this_frame
-
-    for i, (encoding, loc) in enumerate(zip(face_encodings, face_locations)):
-        name = "Unknown"
-        confidence = 0
-        color = (0, 0, 255)
-
-        if known_encodings:
-            distances = face_recognition.face_distance(known_encodings, encoding)
-            best_match = np.argmin(distances)
-            if distances[best_match] < FACE_THRESHOLD:
-                name = known_names[best_match]
-                confidence = round((1 - distances[best_match]) * 100, 2)
+def main(argv=None):
+    global LOG_JSON
+    args = parse_args(argv)
+    LOG_JSON = args.log_format == "json"
+    camera = int(args.camera) if args.camera.isdigit() else args.camera
+
+    # SIGTERM (service stop) and Ctrl+C finish the current frame and shut down cleanly
+    stop = threading.Event()
+    def request_stop(signum, _frame):
+        log("shutdown_requested", signal=signal.Signals(signum).name)
+        stop.set()
+    signal.signal(signal.SIGINT, request_stop)
+    if hasattr(signal, "SIGTERM"):
+        signal.signal(signal.SIGTERM, request_stop)
+
+    # Memory-mapped store plus enrollment journal; the legacy pickle is migrated on first run
+    gallery_options = {"index": args.match_index, "shortlist": args.shortlist,
+                       "nprobe": args.nprobe, "poll_interval": args.gallery_poll}
+    gallery = get_gallery_service(GALLERY_FILE, ENCODINGS_FILE, **gallery_options)
+    BackgroundCompactor(GALLERY_FILE, ENCODINGS_FILE).start()
+    log("gallery_loaded", encodings=len(gallery.matcher()))
+
+    # Each worker opens the same gallery (shared pages) and hot-reloads it
+    try:
+        engine = RecognitionEngine(GALLERY_FILE, ENCODINGS_FILE, workers=args.workers,
+                                   max_pending=args.max_pending, threshold=args.threshold,
+                                   detector=args.detector, detector_options=dict(args.detector_option),
+                                   **gallery_options)
+    except (ValueError, FileNotFoundError, RuntimeError) as e:
+        # Bad --detector / --detector-option, or a missing model file
+        log("engine_failed", level="ERROR", detector=args.detector, error=str(e))
+        return 1
+    log("engine_started", workers=engine.workers, detector=args.detector)
+
+    # ---------- CAMERA SAFE INIT ----------
+    # A capture thread keeps only the newest frame, written straight into shared
+    # memory that workers read in place. Spare slots beyond what can be in flight
+    # keep capture from ever stalling.
+    stream = CameraStream(camera, slots=engine.max_pending + 3, width=args.width, height=args.height)
+    if not stream.isOpened():
+        log("camera_unavailable", level="ERROR", camera=args.camera)
+        engine.close()
+        return 1
+    stream.start()
+    ring = stream.ring
+    display = None if args.headless else np.empty(ring.shape, dtype=np.uint8)
+    leases = {}   # frame_id -> FrameRef held by a worker
+    log("camera_started", camera=args.camera, shape=ring.shape, headless=args.headless)
+
+    # One blink session per tracked face, so a queue of people is verified in parallel
+    sessions = SessionManager(challenges=["blink"], consensus_frames=1, cooldown_seconds=args.cooldown,
+                              ear_threshold=args.ear_threshold, blink_frames=args.blink_frames)
+    banners = []   # [(text, until)] for recent punches
+    rate = PunchRate()
+    next_stats = time.monotonic() + args.stats_interval
+    process_this_frame = True
+    tracker = FaceTracker(args.threshold, reverify_every=TRACK_REVERIFY_FRAMES,
+                          uncertain_margin=TRACK_UNCERTAIN_MARGIN,
+                          use_optical_flow=args.optical_flow)
+    motion_gate = MotionGate(sensitivity=MOTION_SENSITIVITY, max_idle_seconds=MOTION_MAX_IDLE_SECONDS)
+    planner = DetectionPlanner(AdaptiveScaler(target_face=args.target_face, budget_ms=args.budget_ms),
+                               full_sweep_every=args.full_sweep_every)
+    face_locations, face_matches = [], []
+    engine_error = None
+
+    def stats():
+        return {"uptime_s": round(time.monotonic() - rate.started, 1), "punches": rate.total,
+                "punches_per_min": round(rate.per_minute(), 2), "camera": stream.stats(),
+                "engine_dropped": engine.dropped, "detection": planner.stats()}
+
+    while not stop.is_set():
+        if args.stats_interval and time.monotonic() >= next_stats:
+            log("stats", **stats())
+            next_stats = time.monotonic() + args.stats_interval
+
+        ref = stream.read(timeout=1.0)
+        if ref is None:
+            if stream.ended:
+                break
+            continue
+        frame = ring.view(ref)
+
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if args.optical_flow else None
+
+        # Empty, static scenes never reach the detector
+        if process_this_frame and motion_gate.should_process(frame, active=bool(tracker.tracks)):
+            # Search around known faces at a scale that suits them; sweep the
+            # whole frame now and then for newcomers
+            scale, regions = planner.plan([track.box for track in tracker.tracks], frame.shape,
+                                          engine.ms_per_mpix)
+            # Faces the tracker already vouches for are not re-encoded
+            try:
+                frame_id = engine.submit(ref, skip_boxes=tracker.trusted_boxes(), block=False,
+                                         scale=scale, regions=regions)
+            except RuntimeError as e:
+                engine_error = e   # workers keep crashing; let the service manager restart us
+                break
+            if frame_id is not None:
+                leases[frame_id] = ref   # the worker now holds our lease on the slot
+                ref = None
+
+        process_this_frame = not process_this_frame
+
+        try:
+            results = engine.poll()
+        except RuntimeError as e:
+            engine_error = e
+            break
+        for frame_id, faces in results:
+            ring.release(leases.pop(frame_id))
+            if faces is None:
+                continue
+            planner.observe(faces)
+            tracks = track_faces(tracker, faces, gray=gray)
+            face_locations = [face["loc"] for face in faces]
+            face_matches = [(track.name or "Unknown", track.distance) for track in tracks]
+
+            # ---------- BLINK + ATTENDANCE ----------
+            # Each face's own blink state; punched identities go on cooldown
+            points = np.stack([face["points"] for face in faces]) if faces else np.empty((0, 68, 2))
+            for status in sessions.update(tracks, points):
+                if status["punch"]:
+                    record = mark_attendance(status["name"])
+                    if record is None:
+                        continue
+                    rate.record()
+                    if not args.headless:
+                        banners.append((f"{status['name']} {record}", time.monotonic() + 2))
+        if not results and args.optical_flow and tracker.tracks:
+            tracks = tracker.predict(gray)
+            face_locations = [track.box for track in tracks]
+            face_matches = [(track.name or "Unknown", track.distance) for track in tracks]
+
+        if args.headless:
+            if ref is not None:
+                ring.release(ref)
+            continue
+
+        # Draw on a private canvas: the ring slot may still be in use by a worker
+        np.copyto(display, frame)
+        frame = display
+        if ref is not None:
+            ring.release(ref)
+
+        for (name, distance), loc in zip(face_matches, face_locations):
+            confidence = 0
+            color = (0, 0, 255)
+
+            if name != "Unknown":
+                confidence = round((1 - distance) * 100, 2)
                 color = (0, 255, 0)
 
-        # ---------- BLINK ----------
-        if i < len(face_landmarks):
-            lm = face_landmarks[i]
-            if "left_eye" in lm and "right_eye" in lm:
-                ear = (
-                    eye_aspect_ratio(lm["left_eye"]) +
-                    eye_aspect_ratio(lm["right_eye"])
-                ) / 2
-
-                if ear < EYE_AR_THRESHOLD:
-                    blink_counter += 1
-                else:
-                    if blink_counter >= EYE_AR_CONSEC_FRAMES:
-                        blink_detected = True
-                    blink_counter = 0
-
-        # ---------- ATTENDANCE ----------
-        if blink_detected and name != "Unknown":
-            record = mark_attendance(name)
-            cv2.putText(frame, f"{name} {record}", (50, 50),
+            top, right, bottom, left = loc
+            cv2.rectangle(frame, (left, top), (right, bottom), color, 2)
+            cv2.putText(frame, f"{name} ({confidence}%)",
+                        (left, top - 10),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.8, color, 2)
+
+        # Show each success for 2 seconds without pausing the scanner
+        now = time.monotonic()
+        banners = [(text, until) for text, until in banners if until > now]
+        for i, (text, _) in enumerate(banners):
+            cv2.putText(frame, text, (50, 50 + 40 * i),
                         cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
-            cv2.imshow("Face Attendance System", frame)
-            
-            cv2.waitKey(2000) # Show success for 2 seconds
-            cap.release()
-            cv2.destroyAllWindows()
-            print(f"[SUCCESS] {name} logged as {record}")
-            os._exit(0) # Exit entirely
-
-        top, right, bottom, left = [v * 4 for v in loc]
-        cv2.rectangle(frame, (left, top), (right, bottom), color, 2)
-        cv2.putText(frame, f"{name} ({confidence}%)",
-                    (left, top - 10),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.8, color, 2)
-
-    cv2.imshow("Face Attendance System", frame)
-
-    if cv2.waitKey(1) & 0xFF == ord("q"):
-        break
-
-cap.release()
-cv2.destroyAllWindows()
+
+        cv2.imshow("Face Attendance System", frame)
+
+        if cv2.waitKey(1) & 0xFF == ord("q"):
+            break
+
+    camera_lost = stream.ended and not stop.is_set()
+    engine.close()
+    stream.release()
+    if not args.headless:
+        cv2.destroyAllWindows()
+    if engine_error is not None:
+        log("stopped", level="ERROR", reason="engine_failed", error=str(engine_error), **stats())
+        return 1
+    log("stopped", level="ERROR" if camera_lost else "INFO", reason="camera_lost" if camera_lost else "requested",
+        **stats())
+    # Non-zero when the camera went away, so a service manager restarts us
+    return 1 if camera_lost else 0
+
+
+# Pool workers re-import this module under spawn/forkserver; only the parent scans
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,155 @@
+"""
+Append-only attendance ledger.
+
+Punches are appended to the existing attendance.csv (same Name,Date,Time,Type
+columns, so pandas readers and exports keep working) with one write() of a
+whole line on an O_APPEND descriptor followed by fsync. A punch therefore costs
+O(1) instead of re-reading and rewriting the whole history, a crash can at
+worst leave a torn final line, and that line is trimmed the next time the
+ledger is opened. A complete last row that merely lacks its newline (saved by
+a spreadsheet, an editor or pandas) is kept and terminated instead.
+"""
+import os
+import io
+import csv
+import threading
+
+COLUMNS = ["Name", "Date", "Time", "Type"]
+RECORD_TYPES = ("Punch-In", "Punch-Out")
+TAIL_BLOCK = 64 * 1024
+
+
+def _encode_row(row):
+    buf = io.StringIO()
+    csv.writer(buf, lineterminator="\n").writerow(row)
+    return buf.getvalue().encode("utf-8")
+
+
+class AttendanceLedger:
+    def __init__(self, path, fsync=True):
+        self.path = path
+        self.fsync = fsync
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._repair_tail()
+        flags = os.O_WRONLY | os.O_APPEND | os.O_CREAT | getattr(os, "O_BINARY", 0)
+        self._fd = os.open(path, flags, 0o644)
+        if os.fstat(self._fd).st_size == 0:
+            self._write(_encode_row(COLUMNS))
+
+    @staticmethod
+    def _is_complete(raw):
+        """ A last line without its newline: a whole row, or a torn append? """
+        try:
+            row = next(csv.reader([raw.rstrip(b"\r").decode("utf-8")]), [])
+        except (UnicodeDecodeError, csv.Error):
+            return False
+        if len(row) != len(COLUMNS):
+            return False
+        # Our appends are cut short from the end, which can leave e.g. "Punch-I"
+        return not any(t.startswith(row[-1]) and t != row[-1] for t in RECORD_TYPES)
+
+    def _repair_tail(self):
+        """ Terminate a complete last row that lacks "\n"; drop one torn by a crash """
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb+") as f:
+            size = f.seek(0, os.SEEK_END)
+            if size == 0:
+                return
+            f.seek(size - 1)
+            if f.read(1) == b"\n":
+                return
+            start = max(0, size - TAIL_BLOCK)
+            f.seek(start)
+            chunk = f.read()
+            cut = chunk.rfind(b"\n")
+            if self._is_complete(chunk[cut + 1:]):
+                f.seek(size)
+                f.write(b"\n")
+            else:
+                f.truncate(start + cut + 1 if cut >= 0 else 0)
+
+    def _write(self, data):
+        # A single write() on an O_APPEND fd lands as one contiguous line
+        os.write(self._fd, data)
+        if self.fsync:
+            os.fsync(self._fd)
+
+    def append(self, name, date, time, record_type):
+        with self._lock:
+            self._write(_encode_row([name, date, time, record_type]))
+
+    def size(self):
+        return os.fstat(self._fd).st_size
+
+    def tail_rows(self, date, end=None):
+        """
+        Rows for `date` and later, read backwards from the end of the file so
+        the cost is proportional to today's punches, not the whole history.
+        """
+        rows = []
+        with open(self.path, "rb") as f:
+            pos = f.seek(0, os.SEEK_END) if end is None else end
+            pending = b""
+            while pos > 0:
+                step = min(TAIL_BLOCK, pos)
+                pos -= step
+                f.seek(pos)
+                lines = (f.read(step) + pending).split(b"\n")
+                # The first piece may be a partial line; keep it for the next block
+                pending = lines.pop(0) if pos > 0 else b""
+                for raw in reversed(lines):
+                    row = self._parse(raw)
+                    if row is None:
+                        continue
+                    if row[1] < date:
+                        return rows[::-1]
+                    rows.append(row)
+            row = self._parse(pending)
+            if row is not None and row[1] >= date:
+                rows.append(row)
+        return rows[::-1]
+
+    def read_from(self, offset):
+        """
+        Complete rows appended after byte `offset` (by this or any other process).
+        Returns (rows, new_offset); a line still being written is left for later.
+        """
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            chunk = f.read()
+        end = chunk.rfind(b"\n")
+        if end < 0:
+            return [], offset
+        rows = [row for row in map(self._parse, chunk[:end].split(b"\n")) if row is not None]
+        return rows, offset + end + 1
+
+    @staticmethod
+    def _parse(raw):
+        raw = raw.rstrip(b"\r")
+        if not raw.strip():
+            return None
+        row = next(csv.reader([raw.decode("utf-8")]))
+        if len(row) != len(COLUMNS) or row == COLUMNS:
+            return None
+        return row
+
+    def close(self):
+        with self._lock:
+            os.close(self._fd)
+
+
+_ledgers = {}
+_ledgers_lock = threading.Lock()
+
+
+def get_ledger(path):
+    """ One ledger (and one append descriptor) per file within a process """
+    key = os.path.abspath(path)
+    with _ledgers_lock:
+        ledger = _ledgers.get(key)
+        if ledger is None:
+            ledger = _ledgers[key] = AttendanceLedger(path)
+        return ledger
@@ -0,0 +1,104 @@
+"""
+Per-day punch state: name -> last punch type/time for today.
+
+Built once from today's tail of the ledger, then kept current by reading only
+the bytes appended since the last decision (so punches written by the GUI, the
+CLI scanner and the API in other processes are seen too). The Punch-In /
+Punch-Out toggle never scans history, and the state resets itself at midnight.
+A punch within MIN_PUNCH_GAP_SECONDS of the name's previous one is a duplicate
+(someone still standing at the door) and is not recorded.
+"""
+import threading
+from datetime import datetime
+
+from records.ledger import get_ledger
+
+MIN_PUNCH_GAP_SECONDS = 60.0
+
+
+class PunchStateIndex:
+    def __init__(self, ledger, clock=datetime.now, min_gap=MIN_PUNCH_GAP_SECONDS):
+        self.ledger = ledger
+        self.clock = clock
+        self.min_gap = min_gap
+        self.day = None
+        self.last = {}                # name -> (type, time) for self.day
+        self._offset = 0
+        self._lock = threading.Lock()
+
+    def _apply(self, rows):
+        for name, date, time, record_type in rows:
+            if date > self.day:
+                # Another process already crossed midnight
+                self.day, self.last = date, {}
+            if date == self.day:
+                self.last[name] = (record_type, time)
+
+    def _sync(self, date):
+        if self.day is None:
+            end = self.ledger.size()
+            self.day = date
+            self._apply(self.ledger.tail_rows(date, end=end))
+            self._offset = end
+        elif date > self.day:
+            # Midnight rollover: a new day starts empty
+            self.day, self.last = date, {}
+
+        rows, self._offset = self.ledger.read_from(self._offset)
+        self._apply(rows)
+
+    def last_punch(self, name, date=None):
+        """ (type, time) of the name's last punch today, or None """
+        with self._lock:
+            self._sync(date or self.clock().strftime("%Y-%m-%d"))
+            return self.last.get(name)
+
+    def next_type(self, name, date=None):
+        last = self.last_punch(name, date)
+        return "Punch-Out" if last is not None and last[0] == "Punch-In" else "Punch-In"
+
+    def punch(self, name, now=None):
+        """
+        Decide the toggle, append it to the ledger and return the record type;
+        None (nothing recorded) if the name's last punch is less than min_gap ago.
+        """
+        now = now or self.clock()
+        date = now.strftime("%Y-%m-%d")
+        time = now.strftime("%H:%M:%S")
+        with self._lock:
+            self._sync(date)
+            last = self.last.get(name)
+            if last is not None and self._since(date, last[1], now) < self.min_gap:
+                return None
+            record_type = "Punch-Out" if last is not None and last[0] == "Punch-In" else "Punch-In"
+            self.ledger.append(name, date, time, record_type)
+            self.last[name] = (record_type, time)
+        return record_type
+
+    @staticmethod
+    def _since(date, time, now):
+        try:
+            last = datetime.strptime(f"{date} {time}", "%Y-%m-%d %H:%M:%S")
+        except ValueError:
+            # A hand-edited row: don't let it block punching
+            return float("inf")
+        return (now.replace(microsecond=0) - last).total_seconds()
+
+    def present_count(self, date=None):
+        """ Number of distinct names punched on `date` (today by default) """
+        with self._lock:
+            self._sync(date or self.clock().strftime("%Y-%m-%d"))
+            return len(self.last)
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_punch_index(path):
+    """ One punch state index per attendance file within a process """
+    with _indexes_lock:
+        index = _indexes.get(path)
+        if index is None:
+            index = _indexes[path] = PunchStateIndex(get_ledger(path))
+        return index
@@ -1,14 +1,17 @@
 import cv2
 import face_recognition
 import os
-import pickle
+from recognition.store import gallery_path_for
+from recognition.journal import append_enrollment
+from recognition.capture import CameraStream
+from recognition.landmarks import encode_faces
 
 name = input("Enter user name: ").strip()
 
 SAVE_DIR = f"data/faces/{name}"
 os.makedirs(SAVE_DIR, exist_ok=True)
 
-video = cv2.VideoCapture(0)
+video = CameraStream(0).start()
 count = 0
 encodings = []
 
@@ -17,8 +20,8 @@ import time
 print("Press 'C' once to start Burst Mode (Auto-capture 20 photos), 'Q' to quit")
 
 while True:
-    ret, frame = video.read()
-    if not ret: break
+    frame = video.read_frame()
+    if frame is None: break
     
     cv2.imshow("Register Face - Press 'C' to Start Burst", frame)
     key = cv2.waitKey(1) & 0xFF
@@ -26,7 +29,8 @@ while True:
     if key == ord('c') or count > 0:
         rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
         faces = face_recognition.face_locations(rgb)
-        face_encs = face_recognition.face_encodings(rgb, faces)
+        # Same 5-point alignment the scanners use for their descriptors
+        face_encs = encode_faces(rgb, faces)
 
         if len(face_encs) == 1:
             encodings.append(face_encs[0])
@@ -44,20 +48,6 @@ video.release()
 cv2.destroyAllWindows()
 
 # Save encodings
-data = {"encodings": [], "names": []}
-if os.path.exists("data/encodings.pkl") and os.path.getsize("data/encodings.pkl") > 0:
-    with open("data/encodings.pkl", "rb") as f:
-        try:
-            old_data = pickle.load(f)
-            if isinstance(old_data, dict) and "encodings" in old_data:
-                data = old_data
-        except EOFError:
-            pass
-
-data["encodings"].extend(encodings)
-data["names"].extend([name] * len(encodings))
-
-with open("data/encodings.pkl", "wb") as f:
-    pickle.dump(data, f)
+append_enrollment(gallery_path_for("data/encodings.pkl"), encodings, [name] * len(encodings))
 
 print("Face registered successfully!")
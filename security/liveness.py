@@ -1,76 +1,177 @@
-import random
 import cv2
-import hashlib
 import numpy as np
-from scipy.spatial import distance as dist
+from collections import deque
 
 CHALLENGES = ["blink", "turn_left", "turn_right"]
 
+ROI_SIZE = 48              # face crops are compared as ROI_SIZE x ROI_SIZE grayscale
+MOTION_THRESHOLD = 1.0     # mean abs difference between consecutive crops; INTER_AREA averages
+                           # sensor noise away (a still photo: ~0.5-1.0), ~1 px of sway clears it
+HASH_SIZE = 16             # dHash grid -> HASH_SIZE * HASH_SIZE bits
+HASH_HISTORY = 32          # crops per track remembered for replay detection
+REPLAY_MAX_BITS = 4        # Hamming distance that counts as "the same crop": re-capturing a
+                           # replayed frame flips ~3-5 of 256 bits, live frames differ by ~9
+TRACK_TTL_FRAMES = 30      # forget a track's state after this many frames unseen
+
+# dlib 68-point indices
+LEFT_EYE = slice(36, 42)
+RIGHT_EYE = slice(42, 48)
+JAW_LEFT, JAW_RIGHT, NOSE_TIP = 0, 16, 31
+
+TURN_LEFT_YAW = 0.35         # nose x relative to the jaw width: 0.5 is centred
+TURN_RIGHT_YAW = 0.65
+
+
+# ===================== LANDMARK KERNEL =====================
+def eye_aspect_ratio(eyes):
+    """ EAR of (..., 6, 2) eye contours, vectorised over the leading axes """
+    eyes = np.asarray(eyes, dtype=np.float32)
+    a = np.linalg.norm(eyes[..., 1, :] - eyes[..., 5, :], axis=-1)
+    b = np.linalg.norm(eyes[..., 2, :] - eyes[..., 4, :], axis=-1)
+    c = np.linalg.norm(eyes[..., 0, :] - eyes[..., 3, :], axis=-1)
+    return (a + b) / (2.0 * np.maximum(c, 1e-6))
+
+
+def landmark_kernel(points):
+    """
+    Liveness measurements for N faces at once from an (N, 68, 2) landmark array.
+
+    Returns (ear, yaw): mean eye aspect ratio of both eyes, and the nose tip's
+    horizontal position across the jaw (0 = far left, 1 = far right; NaN for
+    a degenerate jaw).
+    """
+    points = np.asarray(points, dtype=np.float32).reshape(-1, 68, 2)
+    ear = (eye_aspect_ratio(points[:, LEFT_EYE]) + eye_aspect_ratio(points[:, RIGHT_EYE])) / 2
+
+    face_left = points[:, JAW_LEFT, 0]
+    width = points[:, JAW_RIGHT, 0] - face_left
+    with np.errstate(divide="ignore", invalid="ignore"):
+        yaw = np.where(width != 0, (points[:, NOSE_TIP, 0] - face_left) / width, np.nan)
+    return ear, yaw
+
+
+class BlinkState:
+    """
+    Per-track blink detection with state in flat arrays.
+
+    A blink is EAR below ear_threshold for at least consec_frames updates,
+    followed by an open-eye update; once seen it stays latched until reset().
+    """
+
+    def __init__(self, ear_threshold, consec_frames, capacity=8):
+        self.ear_threshold = ear_threshold
+        self.consec_frames = consec_frames
+        self.slot_of = {}   # track_id -> slot
+        self.closed_frames = np.zeros(capacity, dtype=np.int32)
+        self.blinked = np.zeros(capacity, dtype=bool)
+
+    def _slots(self, track_ids):
+        for track_id in track_ids:
+            if track_id not in self.slot_of:
+                used = set(self.slot_of.values())
+                free = next((i for i in range(len(self.blinked)) if i not in used), None)
+                if free is None:
+                    free = len(self.blinked)
+                    self.closed_frames = np.concatenate([self.closed_frames, np.zeros_like(self.closed_frames)])
+                    self.blinked = np.concatenate([self.blinked, np.zeros_like(self.blinked)])
+                self.closed_frames[free] = 0
+                self.blinked[free] = False
+                self.slot_of[track_id] = free
+        return np.fromiter((self.slot_of[t] for t in track_ids), dtype=np.intp, count=len(track_ids))
+
+    def update(self, track_ids, ear):
+        """ Feed one EAR per track; returns the latched blink flag of each """
+        track_ids = list(track_ids)
+        slots = self._slots(track_ids)
+        closed = np.asarray(ear) < self.ear_threshold
+        counts = self.closed_frames[slots]
+        self.blinked[slots] |= ~closed & (counts >= self.consec_frames)
+        self.closed_frames[slots] = np.where(closed, counts + 1, 0)
+        return self.blinked[slots].copy()
+
+    def latched(self, track_ids):
+        """ Blink flags without feeding a new measurement (False for unknown tracks) """
+        return np.array([t in self.slot_of and bool(self.blinked[self.slot_of[t]]) for t in track_ids], dtype=bool)
+
+    def reset(self, track_ids):
+        slots = [self.slot_of[t] for t in track_ids if t in self.slot_of]
+        self.closed_frames[slots] = 0
+        self.blinked[slots] = False
+
+    def forget(self, live_track_ids):
+        """ Free the slots of tracks that no longer exist """
+        live = set(live_track_ids)
+        for track_id in [t for t in self.slot_of if t not in live]:
+            del self.slot_of[track_id]
+
+
+def face_roi(frame, box, size=ROI_SIZE):
+    """ Small grayscale crop of a (top, right, bottom, left) box """
+    h, w = frame.shape[:2]
+    top, right, bottom, left = box
+    top, left = max(int(top), 0), max(int(left), 0)
+    bottom, right = min(int(bottom), h), min(int(right), w)
+    if bottom <= top or right <= left:
+        return None
+    crop = cv2.resize(frame[top:bottom, left:right], (size, size), interpolation=cv2.INTER_AREA)
+    return cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY) if crop.ndim == 3 else crop
+
+
+def dhash(roi, size=HASH_SIZE):
+    """ Difference hash: sign of horizontal gradients on a size x (size+1) thumbnail """
+    thumb = cv2.resize(roi, (size + 1, size), interpolation=cv2.INTER_AREA)
+    return np.packbits(thumb[:, 1:] > thumb[:, :-1])
+
+
+class _TrackSignals:
+    __slots__ = ("roi", "hashes", "last_seen")
+
+    def __init__(self):
+        self.roi = None
+        self.hashes = deque(maxlen=HASH_HISTORY)
+        self.last_seen = 0
+
+
 class LivenessDetector:
     def __init__(self):
-        self.challenge = random.choice(CHALLENGES)
-        self.blink_counter = 0
-        self.prev_frame = None
-        self.recent_hashes = set()
-
-    def eye_aspect_ratio(self, eye):
-        A = dist.euclidean(eye[1], eye[5])
-        B = dist.euclidean(eye[2], eye[4])
-        C = dist.euclidean(eye[0], eye[3])
-        return (A + B) / (2.0 * C)
-
-    def detect_motion(self, frame):
-        if self.prev_frame is None:
-            self.prev_frame = frame
-            return True
-
-        diff = cv2.absdiff(self.prev_frame, frame)
-        motion_score = diff.mean()
-        self.prev_frame = frame
-
-        return motion_score > 2.0   # blocks photos/screenshots
-
-    def detect_replay(self, frame):
-        frame_hash = hashlib.md5(frame.tobytes()).hexdigest()
-        if frame_hash in self.recent_hashes:
-            return False
-        self.recent_hashes.add(frame_hash)
-        if len(self.recent_hashes) > 10:
-            self.recent_hashes.clear()
-        return True
-
-    def verify_challenge(self, landmark, frame_width):
-        """ Returns True if challenge is currently being met """
-        if self.challenge == "blink":
-            left = landmark["left_eye"]
-            right = landmark["right_eye"]
-            ear = (self.eye_aspect_ratio(left) + self.eye_aspect_ratio(right)) / 2
-            # Threshold adjusted for better sensitivity
-            return ear < 0.22 
-
-        # For head turns, we use the nose position relative to the jawline (chin)
-        # Jawline points: 0 is far left, 16 is far right
-        chin = landmark["chin"]
-        nose = landmark["nose_tip"][0]
-        
-        face_left = chin[0][0]
-        face_right = chin[16][0]
-        face_width = face_right - face_left
-        
-        if face_width == 0: return False
-        
-        # Calculate where the nose is relative to the face width (0 to 1.0)
-        # 0.5 is centered, <0.4 is left, >0.6 is right
-        ratio = (nose[0] - face_left) / face_width
-
-        if self.challenge == "turn_left":
-            return ratio < 0.35 # Nose is far left relative to jaw
-
-        if self.challenge == "turn_right":
-            return ratio > 0.65 # Nose is far right relative to jaw
-
-        return False
-
-    def next_challenge(self):
-        """ Rotate to a different challenge """
-        self.challenge = random.choice([c for c in CHALLENGES if c != self.challenge])
+        self.frame_index = 0
+        self.tracks = {}   # track_id -> _TrackSignals
+
+    def check_frame(self, frame, faces):
+        """
+        Motion and replay signals for every face in one frame.
+
+        faces: iterable of (track_id, (top, right, bottom, left)) in frame pixels.
+        Returns {track_id: (motion_ok, replay_ok)}. Each track is compared only
+        with its own earlier crops, so two people never vouch for each other.
+        """
+        self.frame_index += 1
+        signals = {}
+        for track_id, box in faces:
+            roi = face_roi(frame, box)
+            state = self.tracks.get(track_id)
+            if state is None:
+                state = self.tracks[track_id] = _TrackSignals()
+            state.last_seen = self.frame_index
+            if roi is None:
+                signals[track_id] = (False, False)
+                continue
+
+            # Motion: a printed photo / screenshot held still barely changes
+            motion_ok = state.roi is None or bool(cv2.absdiff(state.roi, roi).mean() > MOTION_THRESHOLD)
+            state.roi = roi
+
+            # Replay: live video never reproduces an earlier crop, even up to re-capture noise
+            h = dhash(roi)
+            replay_ok = True
+            if state.hashes:
+                distances = np.unpackbits(np.bitwise_xor(np.stack(state.hashes), h), axis=1).sum(axis=1)
+                replay_ok = bool(distances.min() > REPLAY_MAX_BITS)
+            state.hashes.append(h)
+
+            signals[track_id] = (motion_ok, replay_ok)
+
+        stale = [tid for tid, st in self.tracks.items() if self.frame_index - st.last_seen > TRACK_TTL_FRAMES]
+        for track_id in stale:
+            del self.tracks[track_id]
+        return signals
@@ -0,0 +1,140 @@
+"""
+Multi-subject verification sessions.
+
+Every tracked face gets its own session: a randomly drawn liveness
+challenge, its own blink counters and a consensus counter of consecutive
+verified results. A track that has punched stays done until the tracker
+loses it, however long the person stands in view, and its identity is also
+on cooldown on any other track (e.g. the same person re-acquired after a
+missed detection), so several people can be verified in parallel from one
+camera without any of them re-punching.
+"""
+import random
+import time
+import numpy as np
+
+from security.liveness import (CHALLENGES, TURN_LEFT_YAW, TURN_RIGHT_YAW,
+                               BlinkState, landmark_kernel)
+
+CONSENSUS_FRAMES = 3       # consecutive verified results before a punch
+COOLDOWN_SECONDS = 10.0    # per identity
+EAR_THRESHOLD = 0.22
+BLINK_CONSEC_FRAMES = 2
+SESSION_TTL = 30           # updates a session survives without its track
+
+
+class Session:
+    __slots__ = ("track_id", "challenge", "consensus", "last_seen", "punched")
+
+    def __init__(self, track_id, challenge):
+        self.track_id = track_id
+        self.challenge = challenge
+        self.consensus = 0
+        self.last_seen = 0
+        self.punched = None   # name this track has punched for
+
+
+class SessionManager:
+    def __init__(self, challenges=CHALLENGES, consensus_frames=CONSENSUS_FRAMES,
+                 cooldown_seconds=COOLDOWN_SECONDS, ear_threshold=EAR_THRESHOLD,
+                 blink_frames=BLINK_CONSEC_FRAMES, liveness=None, clock=time.monotonic):
+        self.challenges = list(challenges)
+        self.consensus_frames = consensus_frames
+        self.cooldown_seconds = cooldown_seconds
+        self.liveness = liveness          # optional LivenessDetector for motion/replay
+        self.clock = clock
+        self.blinks = BlinkState(ear_threshold, blink_frames)
+        self.sessions = {}                # track_id -> Session
+        self.last_punch = {}              # name -> clock() of its last punch
+        self.updates = 0
+
+    def _session(self, track_id):
+        session = self.sessions.get(track_id)
+        if session is None:
+            session = self.sessions[track_id] = Session(track_id, random.choice(self.challenges))
+        session.last_seen = self.updates
+        return session
+
+    def cooling_down(self, name, now=None):
+        last = self.last_punch.get(name)
+        return last is not None and (now or self.clock()) - last < self.cooldown_seconds
+
+    def punched_names(self):
+        """ Identities that punched on a track which is still alive """
+        return {s.punched for s in self.sessions.values() if s.punched is not None}
+
+    def update(self, tracks, points, frame=None, boxes=None):
+        """
+        Advance every session with one recognition result.
+
+        tracks: Track objects (with .track_id and .name), points: (N, 68, 2)
+        landmarks, frame/boxes: full frame and (top, right, bottom, left) boxes
+        for the motion/replay checks. Returns one status dict per face; faces
+        with "punch" set are due for attendance, and their identity is already
+        done until its track is lost.
+        """
+        self.updates += 1
+        now = self.clock()
+        ids = [track.track_id for track in tracks]
+        statuses = []
+        if ids:
+            sessions = [self._session(track_id) for track_id in ids]
+            ear, yaw = landmark_kernel(points)
+            blinked = self.blinks.update(ids, ear)
+            # Every face checked against its own challenge in one pass
+            wanted = np.array([s.challenge for s in sessions])
+            challenge_ok = np.where(wanted == "blink", blinked,
+                                    np.where(wanted == "turn_left", yaw < TURN_LEFT_YAW,
+                                             np.where(wanted == "turn_right", yaw > TURN_RIGHT_YAW, False)))
+
+            signals = {}
+            if self.liveness is not None and frame is not None:
+                signals = self.liveness.check_frame(frame, list(zip(ids, boxes)))
+
+            done = self.punched_names()
+            for track, session, ok in zip(tracks, sessions, challenge_ok):
+                name = track.name or "Unknown"
+                motion_ok, replay_ok = signals.get(track.track_id, (True, True))
+                live_ok = motion_ok and replay_ok
+                status = {"track_id": track.track_id, "name": name, "challenge": session.challenge,
+                          "challenge_ok": bool(ok), "live_ok": live_ok, "punch": False}
+
+                if name == "Unknown":
+                    session.consensus = 0
+                    status["state"] = "unknown"
+                elif name in done or self.cooling_down(name, now):
+                    session.consensus = 0
+                    status["state"] = "cooldown"
+                elif not ok:
+                    session.consensus = 0
+                    status["state"] = "pending"
+                elif not live_ok:
+                    status["state"] = "pending"
+                else:
+                    session.consensus += 1
+                    status["state"] = "verified"
+                    if session.consensus >= self.consensus_frames:
+                        status["punch"] = True
+                        self._punched(session, name, now)
+                        done.add(name)
+                status["consensus"] = session.consensus
+                statuses.append(status)
+
+        self._expire()
+        return statuses
+
+    def _punched(self, session, name, now):
+        self.last_punch[name] = now
+        session.punched = name
+        session.consensus = 0
+        self.blinks.reset([session.track_id])
+
+    def _expire(self):
+        stale = [tid for tid, s in self.sessions.items() if self.updates - s.last_seen > SESSION_TTL]
+        for track_id in stale:
+            del self.sessions[track_id]
+        if stale:
+            self.blinks.forget(self.sessions)
+        horizon = self.clock() - self.cooldown_seconds
+        for name in [n for n, t in self.last_punch.items() if t < horizon]:
+            del self.last_punch[name]
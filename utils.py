@@ -1,16 +1,25 @@
+import os
 import requests
 import time
+from datetime import datetime
+from cloud.client import get_client
 
-API_URL = "http://127.0.0.1:8000/attendance"
+API_BASE = "http://127.0.0.1:8000"
+API_URL = API_BASE + "/attendance"
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+OUTBOX_FILE = os.path.join(BASE_DIR, "data", "outbox.db")
 
 def send_to_cloud(payload, retries=3, timeout=15):
     """
     Sends attendance to the new SQLAlchemy backend with retry logic.
+    Blocks the caller; scanners should use queue_for_cloud() instead.
     """
+    client = get_client(API_BASE)
     for attempt in range(1, retries + 1):
         try:
-            response = requests.post(
-                API_URL,
+            response = client.post(
+                "/attendance",
                 json={
                     "name": payload["name"],
                     "type": payload["type"]
@@ -31,3 +40,31 @@ def send_to_cloud(payload, retries=3, timeout=15):
             time.sleep(2)
 
     return False
+
+# ================= OFFLINE OUTBOX =================
+_outbox = None
+_sender = None
+
+def get_outbox():
+    """ Process-wide outbox with its background sender started on first use """
+    global _outbox, _sender
+    if _outbox is None:
+        from cloud.outbox import Outbox, OutboxSender
+        os.makedirs(os.path.dirname(OUTBOX_FILE), exist_ok=True)
+        _outbox = Outbox(OUTBOX_FILE)
+        _sender = OutboxSender(_outbox, get_client(API_BASE))
+        _sender.start()
+    return _outbox
+
+def queue_for_cloud(payload):
+    """
+    Durably queues a punch for the backend and returns immediately.
+    The local "YYYY-MM-DD HH:MM:SS" timestamp is sent with its UTC offset so the
+    server records when the punch happened, not when the queue drained.
+    """
+    event = {"name": payload["name"], "type": payload["type"]}
+    if payload.get("timestamp"):
+        local = datetime.strptime(payload["timestamp"], "%Y-%m-%d %H:%M:%S")
+        event["timestamp"] = local.astimezone().isoformat()
+    get_outbox().enqueue(event)
+    return True